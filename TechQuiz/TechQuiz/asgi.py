@@ -2,6 +2,8 @@
 ASGI config for TechQuiz project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections to /ws/berserk/ go to the
+Round 3 buzzer (api.buzzer).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TechQuiz.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since the buzzer uses the ORM
+from api.buzzer import BUZZER_PATH, buzzer_application
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] == BUZZER_PATH:
+            return await buzzer_application(scope, receive, send)
+        await receive()
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    return await django_application(scope, receive, send)
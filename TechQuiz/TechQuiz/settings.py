@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware', # First, so its timings cover the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,12 +78,53 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'TechQuiz.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database Profile
+# DB_PROFILE=sqlite (default): WAL journaling so polls read while a submit writes, and writers
+#   queue on the lock for SQLITE_BUSY_TIMEOUT seconds instead of failing with "database is locked".
+# DB_PROFILE=postgres: needs psycopg (pip install "psycopg[binary]") and the DATABASE_* variables.
+#   Connections persist for DB_CONN_MAX_AGE seconds, or come from a pool when DB_POOL=True.
+DB_PROFILE = os.getenv('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME', 'techquiz'),
+            'USER': os.getenv('DATABASE_USER', 'techquiz'),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', 'localhost'),
+            'PORT': os.getenv('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv('DB_POOL') == 'True':
+        # Django's pool replaces persistent connections
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+                # Take the write lock when a transaction starts, so two transactions can't both
+                # read and then deadlock upgrading to a write
+                'transaction_mode': 'IMMEDIATE',
+                # Run on every new connection
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+            'TEST': {
+                # A file, not shared-cache memory, so threaded tests wait on locks instead of failing
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
-}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -121,10 +163,85 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+# Outgoing mail is queued (registration_n_login.outbox). EMAIL_SEND_ON_COMMIT (default) sends each
+# message from the request that queued it, once its transaction commits; retries of failed sends
+# need `manage.py send_queued_email`, run every minute from cron or kept running with --loop.
+# EMAIL_QUEUE_THREAD=True sends and retries from a thread in each web process instead (where the
+# server allows threads).
+EMAIL_SEND_ON_COMMIT = os.getenv('EMAIL_SEND_ON_COMMIT', 'True') == 'True'
+EMAIL_QUEUE_THREAD = os.getenv('EMAIL_QUEUE_THREAD') == 'True'
+EMAIL_QUEUE_BATCH_SIZE = int(os.getenv('EMAIL_QUEUE_BATCH_SIZE', 50))
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
 LOGIN_URL = '/admin/login/'
 
 # Session Settings
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# SESSION_BACKEND=cached_db reads sessions from the cache and only writes the database when a
+# session changes (login_view/verify_otp). It is the default only with CACHE_LOCATION: on the
+# per-process cache, a worker that cached a session before another worker changed it (an OTP
+# resend) keeps serving the old copy, so without a shared cache the default is 'db'.
+# Signed-cookie sessions aren't offered: the login OTP is kept in the session and must stay server-side.
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db' if os.getenv('CACHE_LOCATION') else 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
 SESSION_COOKIE_AGE = 86400  # 1 day
-SESSION_SAVE_EVERY_REQUEST = True
+# Saving on every request turns each status/leaderboard poll into a session UPDATE
+SESSION_SAVE_EVERY_REQUEST = os.getenv('SESSION_SAVE_EVERY_REQUEST') == 'True'
 SESSION_COOKIE_SECURE = False # Ensure it works on HTTP for dev
+
+# Cache Settings
+# The api.cache backends are Django's own, plus hit/miss counting for /metrics.
+# Set CACHE_LOCATION (e.g. redis://127.0.0.1:6379/1) to share cached data between worker processes.
+if os.getenv('CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache.RedisCache',
+            'LOCATION': os.getenv('CACHE_LOCATION'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache.LocMemCache',
+            'LOCATION': 'techquiz',
+        }
+    }
+
+# Worker processes serving requests (WEB_CONCURRENCY, as gunicorn reads it). With more than one,
+# state the workers must agree on (berserk counters) needs CACHE_LOCATION; see api.checks.
+WEB_WORKERS = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Snapshot versions tag the polling responses (ETags) and key their cached copies (api.snapshots).
+# 'cache' keeps them as counters in the cache, so unchanged polls cost no queries, and needs the
+# shared cache above; 'database' derives them from the rows in one query per poll and is the default
+# without CACHE_LOCATION, where each worker process has its own cache.
+SNAPSHOT_VERSIONS = os.getenv('SNAPSHOT_VERSIONS', 'cache' if os.getenv('CACHE_LOCATION') else 'database')
+
+# Question Bank Cache (seconds)
+QUESTION_BANK_TTL = int(os.getenv('QUESTION_BANK_TTL', 300))
+QUESTION_BANK_STALE_TTL = int(os.getenv('QUESTION_BANK_STALE_TTL', 3600))
+QUESTION_BANK_LOCAL_TTL = int(os.getenv('QUESTION_BANK_LOCAL_TTL', 10))
+
+# Question Sources
+# Rounds read from their Google Sheet by default. Point ROUND1_QUESTIONS_FILE / ROUND2_QUESTIONS_FILE
+# at a local .csv, .json or .yaml file to serve that round without network access.
+QUESTION_SOURCES = {}
+for _round in (1, 2):
+    if os.getenv(f'ROUND{_round}_QUESTIONS_FILE'):
+        QUESTION_SOURCES[_round] = {
+            'BACKEND': 'file',
+            'PATH': os.getenv(f'ROUND{_round}_QUESTIONS_FILE'),
+            'CLAMP': _round == 2,
+        }
+
+# Round 3 Buzzer
+# Subtract half of each WebSocket client's measured round trip from its press times
+BERSERK_LATENCY_COMPENSATION = os.getenv('BERSERK_LATENCY_COMPENSATION') == 'True'
+# 'True' records berserk presses in background batches instead of as each press is judged.
+# Queued presses are flushed at a clean shutdown, but lost if a worker is killed or recycled
+# mid-round, so only enable it where the server shuts workers down gracefully.
+BERSERK_WRITE_BEHIND = os.getenv('BERSERK_WRITE_BEHIND') == 'True'
+
+# Metrics
+# Per-view latency, query counts and cache hits (api.metrics), served at /metrics in Prometheus format.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token only superusers can read /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
+from api.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,5 +28,6 @@ urlpatterns = [
     path('eliminated/', TemplateView.as_view(template_name='registration_n_login/eliminated.html'), name='eliminated'),
     path('leaderboard/', TemplateView.as_view(template_name='registration_n_login/leaderboard.html'), name='leaderboard'),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('registration_n_login.urls')),
 ]
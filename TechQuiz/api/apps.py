@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals # Registers the snapshot version bumps
+        from . import checks # Registers the system checks
+        from . import metrics
+        connection_created.connect(metrics.install_db_wrapper)
@@ -0,0 +1,283 @@
+"""
+Round 3 berserk arbitration, shared by the HTTP endpoint and the WebSocket buzzer.
+
+Presses are timestamped the moment they reach the server with arrival_time(),
+which reads a monotonic high-resolution counter anchored to the wall clock
+once per process, so a press's timestamp does not depend on how long it then
+waits for a worker or for the database.
+
+Legality and ordering are decided without touching the database: the current
+question's activation instant is cached per GameState/question version, and
+each team's first legal hit and illegal-hit count live in the Django cache,
+updated with atomic add()/incr(). BerserkLog rows and penalties are written as
+each press is judged, or, with BERSERK_WRITE_BEHIND, queued and written in
+batches by a background flusher. Use a shared cache backend (CACHE_LOCATION)
+when running more than one worker process; the api.E003 system check refuses
+a per-process cache when WEB_WORKERS says there are several.
+"""
+import atexit
+import datetime
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+
+from . import snapshots, events
+from .scoring import adjust_score
+
+# Queue writes and flush them in the background; False writes inline
+BERSERK_WRITE_BEHIND = getattr(settings, 'BERSERK_WRITE_BEHIND', False)
+FLUSH_INTERVAL = getattr(settings, 'BERSERK_FLUSH_INTERVAL', 0.05)
+FLUSH_BATCH_SIZE = 500
+# Flushes a row may fail before it is given up on and logged as dropped
+FLUSH_MAX_ATTEMPTS = 3
+
+STRIKES_PER_PENALTY = 3
+PENALTY_POINTS = 10
+
+STATE_KEY = 'berserk:state:{}.{}'
+LEGAL_KEY = 'berserk:legal:{}:{}'      # question id, team id
+ILLEGAL_KEY = 'berserk:illegal:{}:{}'  # question id, team id
+COUNTER_TIMEOUT = 6 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+# Anchor the monotonic counter to the wall clock once per process
+_WALL_ANCHOR_NS = time.time_ns()
+_MONO_ANCHOR_NS = time.perf_counter_ns()
+
+
+def arrival_ns(perf_ns=None):
+    """Nanoseconds since the epoch for a perf_counter_ns() reading (default: now)."""
+    if perf_ns is None:
+        perf_ns = time.perf_counter_ns()
+    return _WALL_ANCHOR_NS + (perf_ns - _MONO_ANCHOR_NS)
+
+
+def to_datetime(ns):
+    return datetime.datetime.fromtimestamp(ns / 1e9, tz=datetime.timezone.utc)
+
+
+def arrival_time():
+    return to_datetime(arrival_ns())
+
+
+def legal_hit_teams(question_id):
+    from instructor.models import BerserkLog
+
+    return BerserkLog.objects.filter(question_id=question_id, is_illegal=False).values_list('team_id', flat=True)
+
+
+def illegal_hit_counts(question_id):
+    from instructor.models import BerserkLog
+
+    return BerserkLog.objects.filter(question_id=question_id, is_illegal=True).values('team_id').annotate(n=Count('id')).order_by()
+
+
+def _seed_counters(question_id):
+    """Loads what the database already knows about a question into the cache counters."""
+    for team_id in legal_hit_teams(question_id):
+        cache.add(LEGAL_KEY.format(question_id, team_id), 1, COUNTER_TIMEOUT)
+    for row in illegal_hit_counts(question_id):
+        cache.add(ILLEGAL_KEY.format(question_id, row['team_id']), row['n'], COUNTER_TIMEOUT)
+
+
+def get_question_state():
+    """
+    The round 3 state a press is judged against, rebuilt only when GameState or
+    a Round3Question has changed.
+    """
+    from instructor.models import GameState
+
+    key = STATE_KEY.format(*snapshots.get_versions(snapshots.GAME_STATE, snapshots.QUESTIONS))
+    state = cache.get(key)
+    if state is None:
+        game_state = GameState.objects.select_related('current_round3_question').first()
+        current_q = game_state.current_round3_question if game_state else None
+        state = {
+            'active_round': game_state.active_round if game_state else None,
+            'question_id': current_q.id if current_q else None,
+            'is_active': bool(current_q and current_q.is_active),
+            'activated_at': current_q.activated_at if current_q else None,
+        }
+        if current_q:
+            _seed_counters(current_q.id)
+        cache.set(key, state, COUNTER_TIMEOUT)
+    return state
+
+
+def _incr(key):
+    cache.add(key, 0, COUNTER_TIMEOUT)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, COUNTER_TIMEOUT)
+        return 1
+
+
+def register_press(team_id, pressed_at):
+    """
+    Judges a press made at `pressed_at` against the currently selected question
+    and queues it for persistence. Returns (payload, http_status) in the shape
+    /api/quiz/berserk/ responds with.
+    """
+    state = get_question_state()
+    if state['active_round'] != 3:
+        return {'error': 'Round 3 not active'}, 400
+
+    question_id = state['question_id']
+    if not question_id:
+        return {'error': 'No question selected'}, 400
+
+    # 1. First, check if a legal hit already exists for this team/question
+    # A user can appear only once in the leaderboard (first legal hit counts)
+    legal_key = LEGAL_KEY.format(question_id, team_id)
+    if cache.get(legal_key):
+        return {'status': 'logged', 'message': 'Already logged!'}, 200
+
+    # 2. Determine legality: Hit must be >= activated_at
+    is_illegal = not state['is_active'] or not state['activated_at'] or pressed_at < state['activated_at']
+
+    if not is_illegal:
+        # add() is atomic: only one concurrent press per team can win it
+        if not cache.add(legal_key, 1, COUNTER_TIMEOUT):
+            return {'status': 'logged', 'message': 'Already logged!'}, 200
+        writer.put_log(team_id, question_id, pressed_at, False)
+        return {'status': 'logged', 'message': 'Berserk Recorded!'}, 200
+
+    # Count illegal hits for THIS question for THIS team; every third costs points
+    illegal_count = _incr(ILLEGAL_KEY.format(question_id, team_id))
+    writer.put_log(team_id, question_id, pressed_at, True)
+
+    if illegal_count % STRIKES_PER_PENALTY == 0:
+        writer.put_penalty(team_id, PENALTY_POINTS)
+        return {
+            'status': 'illegal',
+            'message': f'PENALTY! {illegal_count} Illegal Hits. -{PENALTY_POINTS} Points.',
+            'illegal_count': illegal_count
+        }, 200
+
+    return {
+        'status': 'illegal',
+        'message': 'Illegal Hit (False Start)!',
+        'illegal_count': illegal_count
+    }, 200
+
+
+class WriteBehindQueue:
+    """Batches BerserkLog inserts and Round3Score penalties onto a background thread."""
+
+    def __init__(self):
+        self.pending = queue.SimpleQueue()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def put_log(self, team_id, question_id, timestamp, is_illegal):
+        self._put(('log', (team_id, question_id, timestamp, is_illegal), 0))
+
+    def put_penalty(self, team_id, points):
+        self._put(('penalty', (team_id, points), 0))
+
+    def _put(self, item):
+        self.pending.put(item)
+        if not BERSERK_WRITE_BEHIND:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='berserk-write-behind', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Berserk flush failed")
+
+    def _drain(self):
+        items = []
+        while len(items) < FLUSH_BATCH_SIZE:
+            try:
+                items.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def flush(self):
+        """
+        Writes everything queued so far. Safe to call from any thread. If a batch
+        fails, its rows are retried one by one: a row that keeps failing is
+        dropped and logged after FLUSH_MAX_ATTEMPTS flushes, so it can't hold
+        back the rest.
+        """
+        with self.flush_lock:
+            retry = []
+            while True:
+                items = self._drain()
+                if not items:
+                    break
+                try:
+                    self._write(items)
+                except Exception:
+                    logger.exception("Berserk batch of %d rows failed; retrying them one by one", len(items))
+                    for item in items:
+                        try:
+                            self._write([item])
+                        except Exception:
+                            kind, data, attempts = item
+                            if attempts + 1 < FLUSH_MAX_ATTEMPTS:
+                                retry.append((kind, data, attempts + 1))
+                            else:
+                                logger.exception("Dropping berserk %s %r after %d failed flushes", kind, data, attempts + 1)
+
+                # Bulk writes skip post_save, so publish the changes by hand
+                snapshots.bump_version(snapshots.BERSERK)
+                transaction.on_commit(events.notify)
+
+            # Back on the queue for the next flush, not this one
+            for item in retry:
+                self.pending.put(item)
+
+    def _write(self, items):
+        from instructor.models import BerserkLog, Round3Score
+
+        logs = []
+        penalties = {}
+        for kind, data, _ in items:
+            if kind == 'log':
+                team_id, question_id, timestamp, is_illegal = data
+                logs.append(BerserkLog(team_id=team_id, question_id=question_id, timestamp=timestamp, is_illegal=is_illegal))
+            else:
+                team_id, points = data
+                penalties[team_id] = penalties.get(team_id, 0) + points
+
+        with transaction.atomic():
+            # A second legal hit for the same team/question is dropped by the
+            # berserklog_first_legal_hit constraint, whichever process wrote it
+            BerserkLog.objects.bulk_create(logs, ignore_conflicts=True)
+            for team_id, points in penalties.items():
+                adjust_score(Round3Score, team_id, -points)
+
+
+writer = WriteBehindQueue()
+# Don't lose queued presses when a worker shuts down cleanly
+atexit.register(writer.flush)
+
+
+def flush():
+    writer.flush()
@@ -0,0 +1,158 @@
+"""
+WebSocket berserk buzzer for Round 3 (ws[s]://<host>/ws/berserk/).
+
+A raw ASGI application mounted next to Django in TechQuiz.asgi. Each press is
+timestamped with the monotonic arrival clock as soon as its frame is received
+and acknowledged straight away; the press is then recorded through the same
+register_press() as the HTTP endpoint.
+
+Protocol (JSON text frames):
+    server -> {"type": "ping", "id": n}             every BUZZER_PING_INTERVAL seconds
+    client -> {"type": "pong", "id": n}             measures round-trip time
+    client -> {"type": "press", "seq": k}
+    server -> {"type": "ack", "seq": k, "server_ts": ..., "rtt_ms": ...}
+    server -> {"type": "result", "seq": k, ...}     same fields as /api/quiz/berserk/
+"""
+import asyncio
+import json
+import logging
+import time
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import parse_cookie
+from django.http.request import split_domain_port, validate_host
+
+from . import berserk
+
+BUZZER_PATH = '/ws/berserk/'
+BUZZER_PING_INTERVAL = getattr(settings, 'BUZZER_PING_INTERVAL', 2)
+# Subtract half the measured round trip from press times (off by default)
+BERSERK_LATENCY_COMPENSATION = getattr(settings, 'BERSERK_LATENCY_COMPENSATION', False)
+# Never compensate by more than this, however slow the client claims to be
+MAX_COMPENSATION_MS = getattr(settings, 'BERSERK_MAX_COMPENSATION_MS', 150)
+RTT_SMOOTHING = 0.2
+
+logger = logging.getLogger(__name__)
+
+
+def _headers(scope):
+    return {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope.get('headers', [])}
+
+
+def _origin_allowed(headers):
+    origin = headers.get('origin')
+    if not origin:
+        return True # Non-browser clients don't send an Origin
+    host = origin.split('://', 1)[-1]
+    domain, _ = split_domain_port(host)
+    allowed_hosts = settings.ALLOWED_HOSTS or ['localhost', '127.0.0.1', '[::1]']
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+@sync_to_async
+def _team_id_from_session(headers):
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    return session.get('user_id')
+
+
+class BuzzerConnection:
+    def __init__(self, team_id, send):
+        self.team_id = team_id
+        self.send_message = send
+        self.pings = {}  # ping id -> monotonic send time (ns)
+        self.next_ping = 0
+        self.rtt_ns = None
+        self.tasks = set()
+
+    async def send_json(self, data):
+        await self.send_message({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def ping_loop(self):
+        while True:
+            self.next_ping += 1
+            self.pings[self.next_ping] = time.perf_counter_ns()
+            # Forget pings that were never answered
+            for stale in [i for i in self.pings if i < self.next_ping - 5]:
+                del self.pings[stale]
+            await self.send_json({'type': 'ping', 'id': self.next_ping})
+            await asyncio.sleep(BUZZER_PING_INTERVAL)
+
+    def record_pong(self, ping_id, received_ns):
+        sent_ns = self.pings.pop(ping_id, None)
+        if sent_ns is None:
+            return
+        sample = received_ns - sent_ns
+        if self.rtt_ns is None:
+            self.rtt_ns = sample
+        else:
+            self.rtt_ns = int((1 - RTT_SMOOTHING) * self.rtt_ns + RTT_SMOOTHING * sample)
+
+    def press_time(self, arrived_ns):
+        if BERSERK_LATENCY_COMPENSATION and self.rtt_ns:
+            arrived_ns -= min(self.rtt_ns // 2, MAX_COMPENSATION_MS * 1_000_000)
+        return berserk.to_datetime(arrived_ns)
+
+    async def handle_press(self, seq, pressed_at):
+        try:
+            payload, status = await sync_to_async(berserk.register_press)(self.team_id, pressed_at)
+        except Exception as e:
+            logger.exception("Berserk press from team %s failed", self.team_id)
+            payload, status = {'error': str(e)}, 500
+        await self.send_json({'type': 'result', 'seq': seq, 'http_status': status, **payload})
+
+    async def handle(self, text, arrived_ns, received_ns):
+        try:
+            message = json.loads(text or '{}')
+        except json.JSONDecodeError:
+            return
+        if not isinstance(message, dict):
+            return # Valid JSON, but not a message ([], 1, "x", null)
+
+        if message.get('type') == 'pong':
+            self.record_pong(message.get('id'), received_ns)
+
+        elif message.get('type') == 'press':
+            seq = message.get('seq')
+            pressed_at = self.press_time(arrived_ns)
+            await self.send_json({
+                'type': 'ack',
+                'seq': seq,
+                'server_ts': pressed_at.isoformat(),
+                'rtt_ms': round(self.rtt_ns / 1e6, 2) if self.rtt_ns else None,
+            })
+            task = asyncio.create_task(self.handle_press(seq, pressed_at))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+
+async def buzzer_application(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    headers = _headers(scope)
+    team_id = await _team_id_from_session(headers) if _origin_allowed(headers) else None
+    if not team_id:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    connection = BuzzerConnection(team_id, send)
+    pinger = asyncio.create_task(connection.ping_loop())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.receive':
+                # Stamp before anything else touches the frame
+                received_ns = time.perf_counter_ns()
+                arrived_ns = berserk.arrival_ns(received_ns)
+                await connection.handle(message.get('text'), arrived_ns, received_ns)
+            elif message['type'] == 'websocket.disconnect':
+                break
+    finally:
+        pinger.cancel()
@@ -0,0 +1,42 @@
+"""
+Cache backends that count hits and misses for api.metrics.
+
+Drop-in replacements for Django's LocMemCache and RedisCache (see CACHES in
+settings). Only reads are counted; a miss is a key that wasn't there.
+"""
+import threading
+
+from django.core.cache.backends.locmem import LocMemCache as DjangoLocMemCache
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+
+from . import metrics
+
+_MISSING = object()
+_inside = threading.local()
+
+
+class MetricsMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        # BaseCache.get_many() calls get() per key; those were counted by get_many()
+        if not getattr(_inside, 'get_many', False):
+            metrics.record_cache(int(value is not _MISSING), int(value is _MISSING))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        _inside.get_many = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            _inside.get_many = False
+        metrics.record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(MetricsMixin, DjangoLocMemCache):
+    pass
+
+
+class RedisCache(MetricsMixin, DjangoRedisCache):
+    pass
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries each worker process keeps to itself
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+    'api.cache.LocMemCache',
+)
+
+
+@register(Tags.caches)
+def check_snapshot_versions(app_configs, **kwargs):
+    versions = getattr(settings, 'SNAPSHOT_VERSIONS', 'cache')
+    if versions not in ('cache', 'database'):
+        return [Error(
+            f"SNAPSHOT_VERSIONS must be 'cache' or 'database', not {versions!r}.",
+            id='api.E001',
+        )]
+    if versions == 'cache' and settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        return [Error(
+            "SNAPSHOT_VERSIONS='cache' needs a cache shared by all worker processes.",
+            hint="Set CACHE_LOCATION, or use SNAPSHOT_VERSIONS='database'. Silence api.E002 only for a single-process server.",
+            id='api.E002',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_berserk_counters(app_configs, **kwargs):
+    # api.berserk judges presses with counters in the cache: per process, each worker would
+    # count its own illegal hits and accept its own first legal hit
+    if getattr(settings, 'WEB_WORKERS', 1) > 1 and settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        return [Error(
+            f"Berserk arbitration needs a cache shared by the {settings.WEB_WORKERS} worker processes (WEB_WORKERS).",
+            hint="Set CACHE_LOCATION, or run a single worker process (WEB_CONCURRENCY=1).",
+            id='api.E003',
+        )]
+    return []
@@ -0,0 +1,63 @@
+"""
+Change notifications for the Server-Sent Events stream (/api/events/).
+
+Writes that bump a snapshot version call notify() once their transaction
+commits, which wakes every stream in this process straight away. Streams also
+re-check the shared versions every SSE_POLL_INTERVAL seconds, which picks up
+writes made by other worker processes.
+"""
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+SSE_POLL_INTERVAL = getattr(settings, 'SSE_POLL_INTERVAL', 1.0)
+SSE_HEARTBEAT = getattr(settings, 'SSE_HEARTBEAT', 15)
+# Streams are closed after this long so clients reconnect and rebalance across workers
+SSE_MAX_AGE = getattr(settings, 'SSE_MAX_AGE', 600)
+# Each re-check reads the snapshot versions. With SNAPSHOT_VERSIONS = 'cache' that is a cache
+# lookup; with 'database' it is the version UNION query, so every open stream runs one query per
+# SSE_POLL_INTERVAL for as long as it lives (up to SSE_MAX_AGE), about what the same client would
+# cost polling /api/game/status/ once a second. Raise SSE_POLL_INTERVAL, or set CACHE_LOCATION,
+# when many clients stream against the database.
+
+_subscribers = set()  # (loop, asyncio.Event)
+_lock = threading.Lock()
+
+
+def notify():
+    """Wakes all streams in this process. Safe to call from any thread."""
+    with _lock:
+        subscribers = list(_subscribers)
+    for loop, event in subscribers:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass # Loop already closed; the stream is going away
+
+
+@contextmanager
+def subscribe():
+    """Registers the calling stream for notifications; yields its asyncio.Event."""
+    subscriber = (asyncio.get_running_loop(), asyncio.Event())
+    with _lock:
+        _subscribers.add(subscriber)
+    try:
+        yield subscriber[1]
+    finally:
+        with _lock:
+            _subscribers.discard(subscriber)
+
+
+async def wait_for_change(event, timeout=SSE_POLL_INTERVAL):
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    event.clear()
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,103 @@
+"""
+Materialized top-K leaderboard for /api/leaderboard/.
+
+The leaderboard is computed in the database (ORDER BY ... LIMIT, served by the
+indexes in instructor.models) and cached under the versions of the data it was
+built from. It is only recomputed after a score, berserk log, question or
+GameState write has moved one of those versions on.
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from . import snapshots
+from .ranking import ranked
+
+LEADERBOARD_SIZE = 10
+LEADERBOARD_KEY = 'leaderboard:{}'
+
+
+def current_versions():
+    return snapshots.get_versions(snapshots.GAME_STATE, snapshots.SCORES, snapshots.BERSERK)
+
+
+def top_scores(score_model):
+    # Rank: Score Desc, Time Asc (teams without a time go last)
+    return ranked(score_model).select_related('team')[:LEADERBOARD_SIZE]
+
+
+def first_legal_hits(question):
+    from instructor.models import BerserkLog
+
+    # First legal hit per team, earliest first (a team has at most one legal hit per question)
+    return BerserkLog.objects.filter(
+        question=question,
+        is_illegal=False
+    ).values('team_id', 'team__team_name', first_hit=F('timestamp')).order_by('timestamp', 'team_id')[:LEADERBOARD_SIZE]
+
+
+def _score_rows(score_model):
+    scores = top_scores(score_model)
+    return [
+        {
+            'rank': idx,
+            'team_name': s.team.team_name,
+            'score': s.score,
+            'timestamp': s.completion_time.strftime('%H:%M:%S.%f')[:-3] if s.completion_time else "N/A"
+        }
+        for idx, s in enumerate(scores, 1)
+    ]
+
+
+def _berserk_rows(question):
+    first_hits = first_legal_hits(question)
+    return [
+        {
+            'rank': idx,
+            'team_name': hit['team__team_name'],
+            'score': 'LOGGED',
+            'timestamp': timezone.localtime(hit['first_hit']).strftime('%H:%M:%S.%f')[:-3]
+        }
+        for idx, hit in enumerate(first_hits, 1)
+    ]
+
+
+def build_leaderboard():
+    """Computes the leaderboard payload, or None if GameState has not been created."""
+    from instructor.models import GameState, Round1Score, Round2Score
+
+    game_state = GameState.objects.select_related('current_round3_question').first()
+    if not game_state:
+        return None
+
+    active_round = game_state.active_round
+    current_q = game_state.current_round3_question if active_round == 3 else None
+
+    leaderboard_data = []
+    if active_round == 1:
+        leaderboard_data = _score_rows(Round1Score)
+    elif active_round == 2:
+        leaderboard_data = _score_rows(Round2Score)
+    elif current_q:
+        leaderboard_data = _berserk_rows(current_q)
+
+    return {
+        'active_round': active_round,
+        'round_status': game_state.round_status,
+        'leaderboard': leaderboard_data,
+        'active_question_text': current_q.question_text if current_q else None,
+        'active_question_number': current_q.sequence_order if current_q else None,
+        'is_unlocked': current_q.is_active if current_q else False
+    }
+
+
+def get_leaderboard(versions=None):
+    """Returns the cached leaderboard payload for the given (or current) versions."""
+    versions = versions or current_versions()
+    key = LEADERBOARD_KEY.format('.'.join(str(v) for v in versions))
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_leaderboard()
+        if payload is not None:
+            cache.set(key, payload, 3600)
+    return payload
@@ -0,0 +1,266 @@
+"""
+Micro-benchmarks for the CPU and query paths that scale with event size.
+
+  sheet_parse            question sheet rows -> question dicts (rounds 1 and 2)
+  answer_key_build       compiling a round's AnswerKey
+  score_answers          scoring a submission, {question_id, selected_option} format
+  score_compact          scoring a submission, compact format
+  get_rank               a team's rank, as get_game_status computes it
+  leaderboard_scores     the round 1/2 leaderboard, built from the score table
+  leaderboard_berserk    the round 3 leaderboard: first legal hit per team
+
+Inputs are synthetic, generated from --seed, at each of --sizes (rows,
+questions, teams or logs, depending on the benchmark). Database benchmarks run
+in a throwaway test database, each size seeded inside a transaction that is
+rolled back afterwards.
+
+--output writes the results as JSON; --baseline compares against such a file
+and fails if any benchmark got slower than --threshold allows.
+"""
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from api.leaderboard import build_leaderboard
+from api.ranking import get_rank
+from api.scoring import AnswerKey
+from instructor import synthetic
+from instructor.models import BerserkLog, GameState, Round1Score, Round3Question
+from instructor.sheets import parse_question_rows
+
+DEFAULT_SIZES = '100,1000,10000,100000'
+BATCH_SIZE = 1000
+
+BENCHMARKS = {}  # name -> (unit, uses the database, setup(size, rng) -> callable to time)
+
+
+def benchmark(name, unit, db=False):
+    def register(setup):
+        BENCHMARKS[name] = (unit, db, setup)
+        return setup
+    return register
+
+
+def sheet_row(n, rng):
+    options = [f'Answer {n}.{o}' for o in range(1, 5)]
+    correct = rng.randrange(4)
+    # Every way the sheet may write the correct option
+    spelling = rng.choice([str(correct + 1), 'ABCD'[correct], f'Option {correct + 1}', options[correct]])
+    return [f'Question {n}?'] + options + [spelling]
+
+
+def questions(size, rng):
+    return [{'id': n, 'q': f'Question {n}?', 'options': ['a', 'b', 'c', 'd'], 'correct': rng.randrange(4)} for n in range(1, size + 1)]
+
+
+@benchmark('sheet_parse', 'rows')
+def bench_sheet_parse(size, rng):
+    rows = [['Question', 'Option 1', 'Option 2', 'Option 3', 'Option 4', 'Correct Option']]
+    rows += [sheet_row(n, rng) for n in range(1, size + 1)]
+    return lambda: parse_question_rows(rows)
+
+
+@benchmark('answer_key_build', 'questions')
+def bench_answer_key_build(size, rng):
+    bank = questions(size, rng)
+    return lambda: AnswerKey(1, 1, bank, 10)
+
+
+@benchmark('score_answers', 'questions')
+def bench_score_answers(size, rng):
+    key = AnswerKey(1, 1, questions(size, rng), 10)
+    answers = [{'question_id': n, 'selected_option': rng.randrange(4)} for n in range(1, size + 1)]
+    return lambda: key.score(answers)
+
+
+@benchmark('score_compact', 'questions')
+def bench_score_compact(size, rng):
+    key = AnswerKey(1, 1, questions(size, rng), 10)
+    answers = [rng.randrange(-1, 4) for _ in range(size)]
+    return lambda: key.score_compact(answers)
+
+
+def seed_scores(size, rng):
+    # The generate_dataset distributions: clustered scores, completion times close together
+    teams = synthetic.generate_teams(size, rng, BATCH_SIZE)
+    synthetic.generate_scores(1, teams, rng, batch_size=BATCH_SIZE)
+    return teams
+
+
+def set_round(active_round, question=None):
+    game_state = GameState.load()
+    game_state.active_round = active_round
+    game_state.current_round3_question = question
+    game_state.save()
+
+
+@benchmark('get_rank', 'teams', db=True)
+def bench_get_rank(size, rng):
+    teams = seed_scores(size, rng)
+    team = teams[size // 2]
+    return lambda: get_rank(Round1Score, team)
+
+
+@benchmark('leaderboard_scores', 'teams', db=True)
+def bench_leaderboard_scores(size, rng):
+    seed_scores(size, rng)
+    set_round(1)
+    return build_leaderboard
+
+
+@benchmark('leaderboard_berserk', 'logs', db=True)
+def bench_leaderboard_berserk(size, rng):
+    # Each team: one legal hit just after the unlock, the rest false starts just before it
+    teams = synthetic.generate_teams(max(size // 5, 1), rng, BATCH_SIZE)
+    activated_at = timezone.now()
+    question = Round3Question.objects.create(question_text='Bench', sequence_order=1, is_active=True, activated_at=activated_at)
+    logs = [
+        BerserkLog(team=team, question=question, timestamp=activated_at + timedelta(microseconds=rng.randrange(2_000_000)))
+        for team in teams
+    ]
+    while len(logs) < size:
+        logs.append(BerserkLog(
+            team=rng.choice(teams), question=question, is_illegal=True,
+            timestamp=activated_at - timedelta(microseconds=rng.randrange(1, 500_000)),
+        ))
+    BerserkLog.objects.bulk_create(logs, batch_size=BATCH_SIZE)
+    set_round(3, question)
+    return build_leaderboard
+
+
+def measure(fn, repeat, min_time):
+    """Seconds per call: min and median over `repeat` runs of enough calls to last min_time."""
+    fn()  # Warm up caches and query plans
+
+    def timed(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - start
+
+    # Grow the loop count like timeit's autorange
+    loops = 1
+    while True:
+        elapsed = timed(loops)
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    runs = [elapsed / loops] + [timed(loops) / loops for _ in range(repeat - 1)]
+    return {'loops': loops, 'min': min(runs), 'median': statistics.median(runs)}
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+class Command(BaseCommand):
+    help = "Runs the parsing, scoring and ranking micro-benchmarks at several sizes, optionally against a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Comma-separated input sizes (default {DEFAULT_SIZES})')
+        parser.add_argument('--only', default='', help='Comma-separated benchmark names: ' + ', '.join(BENCHMARKS))
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark and size')
+        parser.add_argument('--min-time', type=float, default=0.1, help='Minimum seconds per timed run')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic inputs')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against results previously written with --output')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown over the baseline counted as a regression (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError(f"--sizes must be comma-separated integers, got '{options['sizes']}'")
+        names = [name for name in options['only'].split(',') if name] or list(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(unknown)}")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        # Keep GameState signal version bumps out of any shared cache
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+        uses_db = any(BENCHMARKS[name][1] for name in names)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False) if uses_db else None
+        try:
+            with override_settings(CACHES=caches):
+                results = self.run_benchmarks(names, sizes, options)
+        finally:
+            if uses_db:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'machine': platform.machine(),
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {len(results)} results to {options['output']}")
+
+        if baseline is not None:
+            self.compare(results, baseline, options['threshold'])
+
+    def run_benchmarks(self, names, sizes, options):
+        results = {}
+        for name in names:
+            unit, uses_db, setup = BENCHMARKS[name]
+            for size in sizes:
+                rng = random.Random(f"{options['seed']}:{name}:{size}")
+                with transaction.atomic():
+                    fn = setup(size, rng)
+                    timing = measure(fn, options['repeat'], options['min_time'])
+                    transaction.set_rollback(True)
+
+                key = f'{name}[{size}]'
+                results[key] = {'benchmark': name, 'size': size, 'unit': unit, **timing}
+                self.stdout.write(f"{key:<32}{format_seconds(timing['min']):>12} min{format_seconds(timing['median']):>12} median  ({size} {unit}, {timing['loops']} loops)")
+        return results
+
+    def compare(self, results, baseline, threshold):
+        self.stdout.write(f"\nAgainst the baseline (regression: more than {threshold:.0%} slower)")
+        regressions = []
+        for key, result in results.items():
+            base = baseline.get(key)
+            if not base:
+                self.stdout.write(f"{key:<32}{'no baseline':>12}")
+                continue
+            # min is the least noisy of the timings
+            ratio = result['min'] / base['min']
+            line = f"{key:<32}{format_seconds(base['min']):>12} -> {format_seconds(result['min']):>10}  {ratio:6.2f}x"
+            if ratio > 1 + threshold:
+                regressions.append(key)
+                self.stdout.write(self.style.ERROR(line + '  REGRESSION'))
+            elif ratio < 1 / (1 + threshold):
+                self.stdout.write(self.style.SUCCESS(line + '  faster'))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
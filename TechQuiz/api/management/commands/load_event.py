@@ -0,0 +1,307 @@
+"""
+Load harness that replays an event day against a throwaway database.
+
+N simulated teams, each with its own test Client and session, go through:
+  1. logging in with the OTP flow, spread over --login-window seconds;
+  2. a round in which every team polls /api/game/status/ every 3 s and
+     /api/leaderboard/ every 5 s, revalidating with the last ETag as the browser does;
+  3. the round-end burst: every team submits /api/quiz/submit_round/ within
+     --burst-window seconds, while polling goes on;
+  4. round 3, where every team hammers /api/quiz/berserk/ around the unlock,
+     some of them jumping the gun.
+
+Requests run in-process through the full middleware stack, so latencies
+include Django's request handling but no network or web server. Each team's
+polling runs on its own thread. The database is a fresh test database and
+cache keys get a per-run prefix, so nothing live is touched.
+"""
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from api import berserk
+from instructor.models import GameState, Question, QuestionSet, Round3Question
+from registration_n_login import throttle
+from registration_n_login.models import Team, TeamEmail
+
+ENDPOINTS = ['login', 'verify_otp', 'game_status', 'leaderboard', 'submit_round', 'berserk']
+PERCENTILES = [50, 95, 99]
+QUESTIONS = 10
+OPTIONS = 4
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects (start, seconds, status) samples per endpoint from many threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, endpoint, start, seconds, status):
+        with self.lock:
+            self.samples[endpoint].append((start, seconds, status))
+
+    def summary(self):
+        report = {}
+        for endpoint in ENDPOINTS:
+            samples = self.samples.get(endpoint)
+            if not samples:
+                continue
+            latencies = sorted(seconds for _, seconds, _ in samples)
+            # 304 is a successful revalidation; 0 means the request raised
+            errors = sum(1 for _, _, status in samples if status == 0 or status >= 400)
+            first = min(start for start, _, _ in samples)
+            last = max(start + seconds for start, seconds, _ in samples)
+            report[endpoint] = {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'throughput': len(samples) / max(last - first, 1e-6),
+                **{f'p{pct}_ms': percentile(latencies, pct) * 1000 for pct in PERCENTILES},
+                'max_ms': latencies[-1] * 1000,
+            }
+        return report
+
+
+class SimulatedTeam:
+    def __init__(self, team, index, recorder):
+        self.team = team
+        self.recorder = recorder
+        # Each team behind its own address, so the per-IP OTP bucket doesn't see one client
+        self.client = Client(REMOTE_ADDR=f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}', raise_request_exception=False)
+        self.etags = {}
+        self.logged_in = False
+
+    def request(self, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = getattr(self.client, method)(url, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            print(f"Load harness {endpoint} error: {e}")
+            response, status = None, 0
+        self.recorder.record(endpoint, start, time.perf_counter() - start, status)
+        return response
+
+    def log_in(self):
+        self.request('login', 'post', reverse('login'), data={'email': self.team.primary_member_email})
+        # The OTP is mailed; read it from the session instead of the outbox
+        otp = self.client.session.get('auth_otp')
+        if not otp:
+            return
+        response = self.request('verify_otp', 'post', reverse('verify_otp'), data={'otp': otp})
+        self.logged_in = response is not None and response.status_code == 302
+
+    def poll(self, endpoint, url_name):
+        headers = {'If-None-Match': self.etags[endpoint]} if endpoint in self.etags else {}
+        response = self.request(endpoint, 'get', reverse(url_name), headers=headers)
+        if response is not None and response.has_header('ETag'):
+            self.etags[endpoint] = response['ETag']
+
+    def poll_until(self, stop, intervals):
+        """Polls each endpoint on its interval until stop is set. Starts at a random offset, like real clients."""
+        next_due = {endpoint: time.monotonic() + random.uniform(0, interval) for endpoint, (_, interval) in intervals.items()}
+        while not stop.is_set():
+            now = time.monotonic()
+            for endpoint, (url_name, interval) in intervals.items():
+                if next_due[endpoint] <= now:
+                    self.poll(endpoint, url_name)
+                    next_due[endpoint] += interval
+            stop.wait(max(min(next_due.values()) - time.monotonic(), 0))
+
+    def submit(self, round_num, questions):
+        # Compact answers, one option index per question; retries would reuse the submission_id
+        answers = [random.randrange(-1, OPTIONS) for _ in range(questions)]
+        body = {'round': round_num, 'answers': answers, 'submission_id': uuid.uuid4().hex}
+        self.request('submit_round', 'post', reverse('submit_round'), data=json.dumps(body), content_type='application/json')
+
+    def press(self):
+        self.request('berserk', 'post', reverse('berserk_click'))
+
+
+class Command(BaseCommand):
+    help = "Simulates an event day (logins, polling, round-end submissions, berserk presses) and reports latency per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=100, help='Number of simulated teams')
+        parser.add_argument('--login-window', type=float, default=10, help='Seconds over which teams log in')
+        parser.add_argument('--round-seconds', type=float, default=30, help='Seconds of polling before the round ends')
+        parser.add_argument('--burst-window', type=float, default=2, help='Seconds over which round-end submissions (and berserk presses) arrive')
+        parser.add_argument('--status-interval', type=float, default=3, help='Seconds between game status polls per team')
+        parser.add_argument('--leaderboard-interval', type=float, default=5, help='Seconds between leaderboard polls per team')
+        parser.add_argument('--presses', type=int, default=5, help='Berserk presses per team at the unlock')
+        parser.add_argument('--workers', type=int, default=50, help='Threads for the login and burst phases')
+        parser.add_argument('--otp-throttle', action='store_true', help='Keep the real OTP throttle limits (teams refused an OTP never log in)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for repeatable runs')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['teams'] < 1:
+            raise CommandError('--teams must be at least 1')
+        random.seed(options['seed'])
+
+        # Isolate the run: a fresh test database and cache keys of its own
+        caches = {alias: {**config, 'KEY_PREFIX': f'load_event_{uuid.uuid4().hex}'} for alias, config in settings.CACHES.items()}
+        throttle_limits = {} if options['otp_throttle'] else {
+            'ip': {'capacity': options['teams'], 'per': 1},
+            'global': {'capacity': options['teams'], 'per': 1},
+        }
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=caches), mock.patch.dict(throttle.OTP_THROTTLE, throttle_limits):
+                report = self.run_event(options)
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def seed(self, count):
+        teams = Team.objects.bulk_create([
+            Team(
+                team_name=f'Load Team {n}',
+                primary_member_name='Lead', primary_member_email=f'lead{n}@load.example.com',
+                supporting_member_name='Second', supporting_member_email=f'second{n}@load.example.com',
+            )
+            for n in range(count)
+        ], batch_size=500)
+        TeamEmail.objects.bulk_create([row for team in teams for row in team.email_rows()], batch_size=500)
+
+        question_set = QuestionSet.objects.create(round_number=1, version=1, source='load_event')
+        Question.objects.bulk_create([
+            Question(
+                question_set=question_set, number=n, text=f'Question {n}',
+                options=[f'Option {o}' for o in range(OPTIONS)], correct_option=n % OPTIONS,
+            )
+            for n in range(1, QUESTIONS + 1)
+        ])
+        question = Round3Question.objects.create(question_text='Load question', sequence_order=1)
+        return teams, question
+
+    def run_event(self, options):
+        recorder = Recorder()
+        teams, question = self.seed(options['teams'])
+        game_state = GameState.load()
+        simulated = [SimulatedTeam(team, index, recorder) for index, team in enumerate(teams)]
+        started = time.perf_counter()
+
+        def at_random(window, action):
+            def task(sim):
+                time.sleep(random.uniform(0, window))
+                try:
+                    action(sim)
+                finally:
+                    connection.close()
+            return task
+
+        def burst(window, action, targets):
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                list(pool.map(at_random(window, action), targets))
+
+        self.stderr.write(f"Logging in {len(simulated)} teams...")
+        burst(options['login_window'], SimulatedTeam.log_in, simulated)
+        players = [sim for sim in simulated if sim.logged_in]
+        if not players:
+            raise CommandError('No team managed to log in')
+
+        game_state.active_round, game_state.round_status = 1, 'ONGOING'
+        game_state.save()
+
+        stop = threading.Event()
+        intervals = {
+            'game_status': ('get_game_status', options['status_interval']),
+            'leaderboard': ('get_leaderboard', options['leaderboard_interval']),
+        }
+
+        def poller(sim):
+            try:
+                sim.poll_until(stop, intervals)
+            finally:
+                connection.close()
+
+        pollers = [threading.Thread(target=poller, args=(sim,), daemon=True) for sim in players]
+        for thread in pollers:
+            thread.start()
+
+        try:
+            self.stderr.write(f"Round 1: {len(players)} teams polling for {options['round_seconds']:g}s...")
+            time.sleep(options['round_seconds'])
+
+            self.stderr.write("Round end: submission burst...")
+            burst(options['burst_window'], lambda sim: sim.submit(1, QUESTIONS), players)
+            game_state.round_status = 'DONE'
+            game_state.save()
+
+            game_state.active_round, game_state.round_status = 3, 'ONGOING'
+            game_state.current_round3_question = question
+            game_state.save()
+
+            self.stderr.write("Round 3: berserk presses around the unlock...")
+            unlock_in = options['burst_window'] / 4  # A quarter of the presses jump the gun
+
+            def unlock():
+                time.sleep(unlock_in)
+                question.is_active = True
+                question.activated_at = timezone.now()
+                question.save()
+                connection.close()
+
+            unlocker = threading.Thread(target=unlock)
+            unlocker.start()
+            burst(options['burst_window'], lambda sim: [sim.press() for _ in range(options['presses'])], players)
+            unlocker.join()
+        finally:
+            stop.set()
+            for thread in pollers:
+                thread.join()
+            berserk.flush()
+
+        return {
+            'teams': len(simulated),
+            'logged_in': len(players),
+            'duration_s': time.perf_counter() - started,
+            'endpoints': recorder.summary(),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"\n{report['logged_in']}/{report['teams']} teams logged in, event ran {report['duration_s']:.1f}s\n"
+        )
+        header = f"{'endpoint':<14}{'requests':>9}{'req/s':>9}{'errors':>8}{'err %':>8}" + ''.join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES) + f"{'max ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint, stats in report['endpoints'].items():
+            line = (
+                f"{endpoint:<14}{stats['requests']:>9}{stats['throughput']:>9.1f}{stats['errors']:>8}{stats['error_rate'] * 100:>7.1f}%"
+                + ''.join(f"{stats[f'p{pct}_ms']:>10.1f}" for pct in PERCENTILES)
+                + f"{stats['max_ms']:>10.1f}"
+            )
+            style = self.style.WARNING if stats['errors'] else self.style.SUCCESS
+            self.stdout.write(style(line))
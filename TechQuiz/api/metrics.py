@@ -0,0 +1,225 @@
+"""
+Per-view request metrics: latency, SQL queries and time, cache hits and
+response sizes.
+
+api.middleware.MetricsMiddleware measures each request and records it here
+under its URL name (get_game_status, get_leaderboard, berserk_click, ...).
+Cache lookups are counted by the instrumented backends in api.cache. Numbers
+are kept per process, as Prometheus expects from each scrape target: with
+several workers, scrape each one, or read the dashboard panel as one
+worker's share.
+
+render_prometheus() is served at /metrics; snapshot() feeds the instructor
+dashboard.
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+METRICS_ENABLED = getattr(settings, 'METRICS_ENABLED', True)
+
+# Upper bounds of the histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_views = {}
+# A ContextVar rather than a thread local: under ASGI the view runs on another thread
+_current = contextvars.ContextVar('metrics_tally', default=None)
+_started = time.time()
+
+
+class RequestTally:
+    """What one request did, filled in while it runs."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates a quantile by linear interpolation inside its bucket, like histogram_quantile()."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Beyond the last bound: report the bound
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.statuses = defaultdict(int)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.response_bytes = 0
+        self.sized_responses = 0  # Streaming responses have no size
+
+
+def start_request():
+    """Starts counting for the current request. Returns (tally, token for end_request())."""
+    tally = RequestTally()
+    return tally, _current.set(tally)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    tally = _current.get()
+    if tally is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tally.queries += 1
+        tally.db_seconds += time.perf_counter() - start
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """connection_created receiver: counts every query on the connection, without DEBUG."""
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def record_cache(hits, misses):
+    """Called by the instrumented cache backends for every lookup."""
+    tally = _current.get()
+    if tally is not None:
+        tally.cache_hits += hits
+        tally.cache_misses += misses
+
+
+def observe(view, status, seconds, tally, size=None):
+    with _lock:
+        metrics = _views.get(view)
+        if metrics is None:
+            metrics = _views[view] = ViewMetrics()
+        metrics.statuses[status] += 1
+        metrics.latency.observe(seconds)
+        metrics.queries.observe(tally.queries)
+        metrics.db_seconds += tally.db_seconds
+        metrics.cache_hits += tally.cache_hits
+        metrics.cache_misses += tally.cache_misses
+        if size is not None:
+            metrics.response_bytes += size
+            metrics.sized_responses += 1
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+def snapshot():
+    """One dict per view, busiest (most total request time) first."""
+    rows = []
+    with _lock:
+        for view, m in _views.items():
+            requests = m.latency.count
+            lookups = m.cache_hits + m.cache_misses
+            rows.append({
+                'view': view,
+                'requests': requests,
+                'errors': sum(count for status, count in m.statuses.items() if status >= 500),
+                'busy_seconds': round(m.latency.sum, 3),
+                'avg_ms': round(m.latency.sum / requests * 1000, 2),
+                'p50_ms': round(m.latency.quantile(0.5) * 1000, 2),
+                'p95_ms': round(m.latency.quantile(0.95) * 1000, 2),
+                'p99_ms': round(m.latency.quantile(0.99) * 1000, 2),
+                'avg_queries': round(m.queries.sum / requests, 2),
+                'avg_db_ms': round(m.db_seconds / requests * 1000, 2),
+                'cache_hit_ratio': round(m.cache_hits / lookups, 3) if lookups else None,
+                'avg_bytes': round(m.response_bytes / m.sized_responses) if m.sized_responses else None,
+            })
+    rows.sort(key=lambda row: row['busy_seconds'], reverse=True)
+    return {'since': _started, 'now': time.time(), 'views': rows}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, view, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+    return lines
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    families = {
+        'techquiz_http_requests_total': ('counter', 'Requests handled, by view and status code.', []),
+        'techquiz_http_request_duration_seconds': ('histogram', 'Time from the request entering the middleware stack to the response leaving it.', []),
+        'techquiz_http_request_db_queries': ('histogram', 'SQL queries run per request.', []),
+        'techquiz_http_request_db_seconds_total': ('counter', 'Time spent executing SQL.', []),
+        'techquiz_cache_lookups_total': ('counter', 'Cache lookups made while handling requests, by result.', []),
+        'techquiz_http_response_size_bytes': ('summary', 'Response body sizes (streaming responses excluded).', []),
+    }
+    with _lock:
+        for view, m in sorted(_views.items()):
+            v = _label(view)
+            families['techquiz_http_requests_total'][2].extend(
+                f'techquiz_http_requests_total{{view="{v}",status="{status}"}} {count}'
+                for status, count in sorted(m.statuses.items())
+            )
+            families['techquiz_http_request_duration_seconds'][2].extend(_histogram_lines('techquiz_http_request_duration_seconds', v, m.latency))
+            families['techquiz_http_request_db_queries'][2].extend(_histogram_lines('techquiz_http_request_db_queries', v, m.queries))
+            families['techquiz_http_request_db_seconds_total'][2].append(f'techquiz_http_request_db_seconds_total{{view="{v}"}} {m.db_seconds}')
+            families['techquiz_cache_lookups_total'][2].extend([
+                f'techquiz_cache_lookups_total{{view="{v}",result="hit"}} {m.cache_hits}',
+                f'techquiz_cache_lookups_total{{view="{v}",result="miss"}} {m.cache_misses}',
+            ])
+            families['techquiz_http_response_size_bytes'][2].extend([
+                f'techquiz_http_response_size_bytes_sum{{view="{v}"}} {m.response_bytes}',
+                f'techquiz_http_response_size_bytes_count{{view="{v}"}} {m.sized_responses}',
+            ])
+
+    lines = [
+        '# HELP techquiz_process_start_time_seconds Start time of this process since the Unix epoch.',
+        '# TYPE techquiz_process_start_time_seconds gauge',
+        f'techquiz_process_start_time_seconds {_started}',
+    ]
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
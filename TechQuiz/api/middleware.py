@@ -0,0 +1,57 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL queries and time, cache lookups and response size for
+    every request, under the URL name of the view that handled it. Listed first
+    in MIDDLEWARE so the numbers include the session and auth work too.
+    Works under WSGI and ASGI without adding a sync/async switch.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics.METRICS_ENABLED:
+            return self.get_response(request)
+
+        tally, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.record(request, response, time.perf_counter() - start, tally)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        tally, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.record(request, response, time.perf_counter() - start, tally)
+        return response
+
+    def record(self, request, response, seconds, tally):
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match else 'unmatched'
+        # A stream's latency is the time to its first byte; its size is unknown
+        size = None if response.streaming else len(response.content)
+        metrics.observe(view, response.status_code, seconds, tally, size)
@@ -0,0 +1,68 @@
+"""
+Rank lookups for the round score tables.
+
+Teams are ranked by score (highest first), then by completion time (earliest
+first); teams without a completion time rank behind those with one. A team's
+rank is 1 + the number of rows strictly ahead of it, which the database answers
+with a single COUNT instead of loading the whole table into Python.
+"""
+from django.db.models import F, Q
+
+# Top N of the previous round qualify for the next one
+QUALIFICATION_CUTOFFS = {
+    2: 20, # Top 20 from Round 1 play Round 2
+    3: 10, # Top 10 from Round 2 play Round 3
+}
+
+
+def ahead_of(score, completion_time):
+    """Q filter for the rows that rank strictly ahead of the given score/time."""
+    ahead = Q(score__gt=score)
+    if completion_time is None:
+        ahead |= Q(score=score, completion_time__isnull=False)
+    else:
+        ahead |= Q(score=score, completion_time__lt=completion_time)
+    return ahead
+
+
+def ranked(score_model):
+    """All score rows in rank order: score desc, completion time asc, no time last."""
+    return score_model.objects.order_by('-score', F('completion_time').asc(nulls_last=True), 'id')
+
+
+def rows_ahead(score_model, score, completion_time):
+    return score_model.objects.filter(ahead_of(score, completion_time))
+
+
+def get_rank(score_model, team):
+    """
+    Returns (rank, score) for a team in Round1Score/Round2Score/Round3Score,
+    or (None, None) if the team has no score row. Tied teams share a rank.
+    """
+    row = score_model.objects.filter(team=team).values_list('score', 'completion_time').first()
+    if row is None:
+        return None, None
+
+    score, completion_time = row
+    rank = rows_ahead(score_model, score, completion_time).count() + 1
+    return rank, score
+
+
+def qualifies(rank, next_round):
+    """Whether a team ranked `rank` in the previous round plays `next_round`."""
+    return rank is not None and rank <= QUALIFICATION_CUTOFFS[next_round]
+
+
+def qualified_scores(score_model, next_round):
+    """
+    The previous round's score rows, in rank order, of every team that plays
+    `next_round`: the top QUALIFICATION_CUTOFFS[next_round], plus any team tied
+    with the last of them, as qualifies() (which shares tied ranks) would have it.
+    """
+    cutoff = QUALIFICATION_CUTOFFS[next_round]
+    boundary = ranked(score_model).values_list('score', 'completion_time')[cutoff - 1:cutoff].first()
+    if boundary is None:
+        return ranked(score_model)  # Fewer teams than places: everyone plays
+    score, completion_time = boundary
+    tied = Q(score=score, completion_time__isnull=True) if completion_time is None else Q(score=score, completion_time=completion_time)
+    return ranked(score_model).filter(ahead_of(score, completion_time) | tied)
@@ -0,0 +1,137 @@
+"""
+Server-side scoring for Rounds 1 and 2, and point adjustments for any round.
+
+Each round gets an immutable AnswerKey compiled once per question bank version,
+so a submission is scored in a single pass with no re-parsing of the questions.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from instructor import question_bank
+from . import snapshots, events
+
+# Points per correct answer, and points deducted per wrong answer (negative marking)
+ROUND_SCORING = getattr(settings, 'ROUND_SCORING', {
+    1: {'points': 10, 'penalty': 0},
+    2: {'points': 20, 'penalty': 0},
+})
+
+NO_ANSWER = -1
+
+_keys = {}  # round_num -> AnswerKey for the latest version seen
+_keys_lock = threading.Lock()
+
+
+class AnswerKey:
+    """Correct option per question, stored in a tuple indexed by question id."""
+    __slots__ = ('round_num', 'version', 'correct', 'order', 'points', 'penalty', 'question_count')
+
+    def __init__(self, round_num, version, questions, points, penalty=0):
+        size = max((q['id'] for q in questions), default=0) + 1
+        correct = [NO_ANSWER] * size
+        for q in questions:
+            correct[q['id']] = q['correct']
+
+        object.__setattr__(self, 'round_num', round_num)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'correct', tuple(correct))
+        object.__setattr__(self, 'order', tuple(q['id'] for q in questions))  # Question ids as served
+        object.__setattr__(self, 'points', points)
+        object.__setattr__(self, 'penalty', penalty)
+        object.__setattr__(self, 'question_count', len(questions))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('AnswerKey is immutable')
+
+    @property
+    def max_score(self):
+        return self.question_count * self.points
+
+    def score(self, answers):
+        """
+        Scores a list of {'question_id': int, 'selected_option': int} answers.
+        Unknown questions, malformed options, repeated question ids and
+        unanswered questions (-1) are ignored.
+        """
+        correct = self.correct
+        size = len(correct)
+        seen = set()
+        score = 0
+
+        for ans in answers:
+            try:
+                q_id = int(ans.get('question_id'))
+                selected = int(ans.get('selected_option'))
+            except (ValueError, TypeError, AttributeError):
+                continue
+
+            if q_id <= 0 or q_id >= size or q_id in seen or correct[q_id] == NO_ANSWER:
+                continue
+            seen.add(q_id)
+            if selected == NO_ANSWER:
+                continue
+
+            if correct[q_id] == selected:
+                score += self.points
+            else:
+                score -= self.penalty
+
+        return score
+
+    def score_compact(self, options):
+        """
+        Scores the compact format: one selected option index per question, in the
+        order the questions were served, with -1 (or null) for unanswered ones.
+        """
+        correct = self.correct
+        score = 0
+        for q_id, selected in zip(self.order, options):
+            if type(selected) is not int or selected == NO_ANSWER:
+                continue
+            if correct[q_id] == selected:
+                score += self.points
+            else:
+                score -= self.penalty
+        return score
+
+
+def get_answer_key(round_num):
+    """Returns the AnswerKey for the round's current question bank version."""
+    if round_num not in ROUND_SCORING:
+        raise ValueError(f'No scoring rules for round {round_num}')
+
+    bank = question_bank.get_question_bank(round_num)
+    key = _keys.get(round_num)
+    if key is not None and key.version == bank['version']:
+        return key
+
+    rules = ROUND_SCORING[round_num]
+    key = AnswerKey(round_num, bank['version'], bank['questions'], rules['points'], rules.get('penalty', 0))
+    if bank['version'] is not None:
+        with _keys_lock:
+            _keys[round_num] = key
+    return key
+
+
+def score_submission(round_num, answers):
+    """Scores either answer format: a list of {'question_id', 'selected_option'} dicts, or compact."""
+    key = get_answer_key(round_num)
+    if isinstance(answers, list) and answers and not isinstance(answers[0], dict):
+        return key.score_compact(answers)
+    return key.score(answers)
+
+
+def adjust_score(score_model, team_id, delta):
+    """
+    Adds `delta` (possibly negative) to a team's score in a single UPDATE, so
+    concurrent adjustments never overwrite each other.
+    """
+    score_model.objects.get_or_create(team_id=team_id)
+    score_model.objects.filter(team_id=team_id).update(score=F('score') + delta, updated_at=timezone.now())
+    # update() skips post_save and auto_now
+    snapshots.bump_version(snapshots.SCORES)
+    transaction.on_commit(events.notify)
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from instructor.models import GameState, Round1Score, Round2Score, Round3Score, Round3Question, BerserkLog
+from . import snapshots, events
+
+
+@receiver(post_save, sender=GameState)
+def game_state_changed(sender, **kwargs):
+    snapshots.bump_version(snapshots.GAME_STATE)
+    transaction.on_commit(events.notify)
+
+
+@receiver([post_save, post_delete], sender=Round1Score)
+@receiver([post_save, post_delete], sender=Round2Score)
+@receiver([post_save, post_delete], sender=Round3Score)
+def score_changed(sender, **kwargs):
+    snapshots.bump_version(snapshots.SCORES)
+    transaction.on_commit(events.notify)
+
+
+@receiver([post_save, post_delete], sender=Round3Question)
+def question_changed(sender, **kwargs):
+    snapshots.bump_version(snapshots.QUESTIONS)
+    berserk_changed(sender, **kwargs)
+
+
+@receiver([post_save, post_delete], sender=BerserkLog)
+def berserk_changed(sender, **kwargs):
+    snapshots.bump_version(snapshots.BERSERK)
+    transaction.on_commit(events.notify)
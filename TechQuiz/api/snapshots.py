@@ -0,0 +1,132 @@
+"""
+Versioned snapshots of shared game data for the polling endpoints.
+
+Every kind of data the pollers read has a version. Responses are tagged with
+the versions they were built from, so a poll whose ETag still matches can be
+answered with 304 Not Modified, and cached snapshots are keyed by them.
+
+Where the versions live is set by SNAPSHOT_VERSIONS:
+
+  'cache'     a counter in the Django cache, bumped whenever the data is written
+              (see api.signals). Unchanged polls cost no queries, but every
+              worker process must see the same cache, so this needs a shared
+              one (CACHE_LOCATION).
+  'database'  derived from the rows themselves (row count and latest
+              updated_at per table), in one query per poll. Correct with a
+              per-process cache, because a write by any worker changes them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, F, Func, Value
+from django.db.models.functions import Cast
+
+VERSION_KEY = 'version:{}'
+GLOBAL_STATUS_KEY = 'status:global:{}'
+
+GAME_STATE = 'game_state'
+SCORES = 'scores'
+BERSERK = 'berserk'  # Round 3 questions and berserk logs
+QUESTIONS = 'round3_questions'  # Round 3 questions only (berserk arbitration state)
+
+SNAPSHOT_VERSIONS = getattr(settings, 'SNAPSHOT_VERSIONS', 'cache')
+
+# Database mode: the (model, column stamped on every write) pairs each version is derived from
+VERSION_SOURCES = {
+    GAME_STATE: [('instructor.GameState', 'updated_at')],
+    SCORES: [('instructor.Round1Score', 'updated_at'), ('instructor.Round2Score', 'updated_at'), ('instructor.Round3Score', 'updated_at')],
+    QUESTIONS: [('instructor.Round3Question', 'updated_at')],
+    BERSERK: [('instructor.Round3Question', 'updated_at'), ('instructor.BerserkLog', 'id')],
+}
+
+
+def version_query(names):
+    """Database mode: one (source, row count, latest stamp) row per table behind `names`."""
+    from django.apps import apps
+
+    sources = list(dict.fromkeys(source for name in names for source in VERSION_SOURCES[name]))
+    # COUNT and MAX as plain functions: one row per table, without a GROUP BY, so they can be UNIONed.
+    # Stamps are cast to text in SQL, as the columns differ (timestamps, ids) and UNION needs one type.
+    querysets = [
+        apps.get_model(label).objects.order_by().annotate(
+            source=Value(label, output_field=CharField()),
+            rows=Func(F('pk'), function='COUNT'),
+            stamp=Cast(Func(F(column), function='MAX'), output_field=CharField()),
+        ).values_list('source', 'rows', 'stamp')
+        for label, column in sources
+    ]
+    return querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+
+
+def _database_versions(names):
+    stamps = {source: (count, stamp) for source, count, stamp in version_query(names)}
+    return tuple(
+        hashlib.md5(repr([stamps[label] for label, _ in VERSION_SOURCES[name]]).encode()).hexdigest()[:16]
+        for name in names
+    )
+
+
+def get_versions(*names):
+    """The current versions of `names`, in one query in database mode."""
+    if SNAPSHOT_VERSIONS == 'database':
+        return _database_versions(names)
+    return tuple(get_version(name) for name in names)
+
+
+def get_version(name):
+    if SNAPSHOT_VERSIONS == 'database':
+        return _database_versions([name])[0]
+    version = cache.get(VERSION_KEY.format(name))
+    if version is None:
+        # Seed from the clock so a cache restart never reuses an old version
+        cache.add(VERSION_KEY.format(name), int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY.format(name))
+    return version
+
+
+def bump_version(name):
+    if SNAPSHOT_VERSIONS == 'database':
+        return None  # The versions follow the rows
+    try:
+        return cache.incr(VERSION_KEY.format(name))
+    except ValueError:
+        # Key was evicted; reseeding from the clock still moves it forward
+        cache.set(VERSION_KEY.format(name), int(time.time() * 1000), None)
+        return get_version(name)
+
+
+def make_etag(*parts):
+    return '"' + '.'.join(str(p) for p in parts) + '"'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip() for tag in if_none_match.split(',')]
+
+
+def get_global_status(version=None):
+    """
+    The part of /api/game/status/ that is the same for every team. Rebuilt from
+    GameState only when the game_state version has moved on.
+    """
+    from instructor.models import GameState
+    from .ranking import QUALIFICATION_CUTOFFS
+
+    version = version or get_version(GAME_STATE)
+    key = GLOBAL_STATUS_KEY.format(version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        game_state = GameState.load()
+        snapshot = {
+            'version': version,
+            'updated_at': game_state.updated_at.isoformat(),
+            'active_round': game_state.active_round,
+            'round_status': game_state.round_status,
+            # total_score assumption: R1=100 (10x10), R2=200 (10x20)
+            'total_score': 200 if game_state.active_round == 2 else 100,
+            'qualification_cutoff': QUALIFICATION_CUTOFFS.get(game_state.active_round),
+        }
+        cache.set(key, snapshot, 3600)
+    return snapshot
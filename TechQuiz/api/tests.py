@@ -1,3 +1,797 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import re
+import threading
+import time
+import warnings
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from instructor.models import BerserkLog, GameState, Question, QuestionSet, Round1Score, Round2Score, Round3Question, Round3Score
+from registration_n_login.models import Team, TeamEmail
+from . import berserk, checks, metrics, snapshots
+from .buzzer import BuzzerConnection
+from .ranking import QUALIFICATION_CUTOFFS, get_rank, qualified_scores
+from . import scoring
+from .scoring import AnswerKey, adjust_score, score_submission
+from .views import submission_key
+
+THREADS = 8
+CALLS_PER_THREAD = 25
+
+
+def hammer(target, threads=THREADS, calls=CALLS_PER_THREAD):
+    """
+    Runs target(thread_index, call_index) from `threads` threads at once, each
+    making `calls` calls. Returns the exceptions raised, if any.
+    """
+    start = threading.Barrier(threads)
+    errors = []
+
+    def worker(thread_index):
+        start.wait()
+        try:
+            for call_index in range(calls):
+                target(thread_index, call_index)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return errors
+
+
+def make_team(n):
+    return Team.objects.create(
+        team_name=f'Team {n}',
+        primary_member_name='A', primary_member_email=f'a{n}@example.com',
+        supporting_member_name='B', supporting_member_email=f'b{n}@example.com',
+    )
+
+
+class AnswerKeyTests(SimpleTestCase):
+    """Four questions: question N is answered by option N - 1."""
+
+    def setUp(self):
+        questions = [{'id': i, 'q': f'Q{i}', 'options': ['a', 'b', 'c', 'd'], 'correct': i - 1} for i in (1, 2, 3, 4)]
+        self.key = AnswerKey(1, 'v1', questions, points=10, penalty=3)
+
+    def answers(self, *pairs):
+        return [{'question_id': q, 'selected_option': o} for q, o in pairs]
+
+    def test_negative_marking(self):
+        self.assertEqual(self.key.score(self.answers((1, 0), (2, 1), (3, 0))), 10 + 10 - 3)
+        self.assertEqual(self.key.score_compact([0, 1, 0]), 10 + 10 - 3)
+        self.assertEqual(self.key.max_score, 40)
+
+    def test_repeated_question_counts_once(self):
+        self.assertEqual(self.key.score(self.answers((1, 0), (1, 0), (1, 2))), 10)
+
+    def test_unknown_and_malformed_answers_are_ignored(self):
+        answers = self.answers((0, 0), (5, 0), (-1, 0), (99, 0), ('x', 0), (2, None)) + ['junk', {}]
+        self.assertEqual(self.key.score(answers), 0)
+
+    def test_unanswered_is_not_penalised(self):
+        self.assertEqual(self.key.score(self.answers((1, -1), (2, 1))), 10)
+        self.assertEqual(self.key.score_compact([-1, 1, None, 'x']), 10)
+
+    def test_compact_ignores_options_past_the_served_questions(self):
+        self.assertEqual(self.key.score_compact([0, 1, 2, 3, 0, 0]), 40)
+
+    def test_key_is_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.key.points = 100
+
+
+class ScoreSubmissionTests(SimpleTestCase):
+
+    def setUp(self):
+        bank = {'version': 'v1', 'questions': [{'id': 1, 'q': 'Q', 'options': ['a', 'b'], 'correct': 1}]}
+        patcher = mock.patch.object(scoring.question_bank, 'get_question_bank', return_value=bank)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(scoring._keys.clear)
+
+    def test_dict_and_compact_formats_are_detected(self):
+        points = scoring.ROUND_SCORING[1]['points']
+        self.assertEqual(score_submission(1, [{'question_id': 1, 'selected_option': 1}]), points)
+        self.assertEqual(score_submission(1, [1]), points)
+        self.assertEqual(score_submission(1, [None]), 0)
+        self.assertEqual(score_submission(1, []), 0)
+
+    def test_unknown_round_is_rejected(self):
+        with self.assertRaises(ValueError):
+            score_submission(3, [1])
+
+
+class ConcurrentScoreTests(TransactionTestCase):
+    """Concurrent writers must never lose each other's updates."""
+
+    def setUp(self):
+        cache.clear()
+        self.team = make_team(1)
+
+    def test_adjust_score_loses_no_updates(self):
+        errors = hammer(lambda t, c: adjust_score(Round3Score, self.team.id, 1 if t % 2 else -2))
+        self.assertEqual(errors, [])
+        expected = CALLS_PER_THREAD * (THREADS // 2) * (1 - 2)
+        self.assertEqual(Round3Score.objects.get(team=self.team).score, expected)
+
+    def test_instructor_update_score_loses_no_updates(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        GameState.load()
+        clients = [Client() for _ in range(THREADS)]
+        for client in clients:
+            client.login(username='admin', password='pw')
+
+        def click(t, c):
+            response = clients[t].post(reverse('instructor_dashboard'), {'action': 'update_score', 'team_id': self.team.id, 'points': 5})
+            assert response.status_code == 302, response.status_code
+
+        self.assertEqual(hammer(click, calls=5), [])
+        self.assertEqual(Round3Score.objects.get(team=self.team).score, THREADS * 5 * 5)
+
+
+class ConcurrentBerserkTests(TransactionTestCase):
+    """Simultaneous presses are arbitrated exactly once per team."""
+
+    def setUp(self):
+        cache.clear()
+        self.teams = [make_team(n) for n in range(THREADS)]
+        self.question = Round3Question.objects.create(question_text='Q1', sequence_order=1)
+        game_state = GameState.load()
+        game_state.active_round = 3
+        game_state.current_round3_question = self.question
+        game_state.save()
+
+    def activate(self):
+        self.question.is_active = True
+        self.question.activated_at = timezone.now()
+        self.question.save()
+
+    def test_one_legal_hit_per_team(self):
+        self.activate()
+        results = []
+
+        def press(t, c):
+            payload, status = berserk.register_press(self.teams[t % 2].id, berserk.arrival_time())
+            results.append(payload['message'])
+
+        self.assertEqual(hammer(press), [])
+        berserk.flush()
+        self.assertEqual(results.count('Berserk Recorded!'), 2)
+        self.assertEqual(BerserkLog.objects.filter(is_illegal=False).count(), 2)
+
+    def test_every_third_illegal_hit_is_penalized(self):
+        team = self.teams[0]
+        self.assertEqual(hammer(lambda t, c: berserk.register_press(team.id, berserk.arrival_time())), [])
+        berserk.flush()
+        hits = THREADS * CALLS_PER_THREAD
+        self.assertEqual(BerserkLog.objects.filter(team=team, is_illegal=True).count(), hits)
+        self.assertEqual(Round3Score.objects.get(team=team).score, -berserk.PENALTY_POINTS * (hits // berserk.STRIKES_PER_PENALTY))
+
+    def test_database_rejects_a_second_legal_hit(self):
+        BerserkLog.objects.create(team=self.teams[0], question=self.question)
+        BerserkLog.objects.create(team=self.teams[0], question=self.question, is_illegal=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BerserkLog.objects.create(team=self.teams[0], question=self.question)
+
+
+@mock.patch.object(berserk, 'BERSERK_WRITE_BEHIND', False)  # Flush on every put, in the test's thread
+class WriteBehindFlushTests(TestCase):
+    """A row the database rejects doesn't hold back the rest of its batch."""
+
+    def setUp(self):
+        self.team = make_team(0)
+        self.question = Round3Question.objects.create(question_text='Q1', sequence_order=1)
+        self.writer = berserk.WriteBehindQueue()
+
+    def test_bad_row_is_retried_then_dropped(self):
+        now = timezone.now()
+        with self.assertLogs('api.berserk', 'ERROR') as logs:
+            self.writer.put_log(self.team.id, self.question.id, 'not a time', True)
+            self.writer.put_log(self.team.id, self.question.id, now, True)
+            self.writer.put_penalty(self.team.id, berserk.PENALTY_POINTS)
+            self.writer.flush()
+
+        # Good rows were written around the bad one
+        self.assertEqual(BerserkLog.objects.filter(team=self.team).count(), 1)
+        self.assertEqual(Round3Score.objects.get(team=self.team).score, -berserk.PENALTY_POINTS)
+        # The bad one failed FLUSH_MAX_ATTEMPTS flushes, then was dropped
+        self.assertTrue(self.writer.pending.empty())
+        self.assertIn('Dropping berserk log', logs.output[-1])
+
+
+class PollingLoadTests(TransactionTestCase):
+    """Concurrent status/leaderboard polling alongside writes, as in a live round."""
+
+    POLLS_PER_CLIENT = 40
+
+    def setUp(self):
+        cache.clear()
+        self.teams = [make_team(n) for n in range(THREADS)]
+        for n, team in enumerate(self.teams):
+            Round1Score.objects.create(team=team, score=n * 10)
+        game_state = GameState.load()
+        game_state.active_round = 2
+        game_state.save()
+        self.clients = []
+        for team in self.teams:
+            client = Client()
+            session = client.session
+            session['user_id'] = team.id
+            session.save()
+            self.clients.append(client)
+
+    def test_sqlite_profile(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite profile only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_concurrent_polling_throughput(self):
+        status_url, leaderboard_url = reverse('get_game_status'), reverse('get_leaderboard')
+
+        def poll(t, c):
+            # Odd clients also write, so polls contend with score updates
+            if t % 2 and c % 10 == 0:
+                adjust_score(Round1Score, self.teams[t].id, 1)
+            for url in (status_url, leaderboard_url):
+                response = self.clients[t].get(url)
+                assert response.status_code == 200, response.status_code
+
+        started = time.perf_counter()
+        errors = hammer(poll, calls=self.POLLS_PER_CLIENT)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(errors, [])
+        # Each client's polls run back to back, so this is the mean latency a client sees
+        per_poll = elapsed / (self.POLLS_PER_CLIENT * 2)
+        self.assertLess(per_poll, TIME_BUDGET, f"{connection.vendor}: {per_poll * 1000:.0f} ms per poll with {THREADS} clients")
+
+
+# Upper bounds per request with the data QueryBudgetTests seeds, with the
+# snapshot versions in the cache. A view that starts doing per-row queries
+# blows straight through these.
+QUERY_BUDGETS = {
+    'get_game_status': 4,
+    'get_game_status (unchanged)': 0,
+    'get_leaderboard': 2,
+    'get_leaderboard (unchanged)': 0,
+    'submit_round': 9,
+    'berserk_click': 6,
+    'berserk_click (repeat)': 0,
+    'instructor_dashboard': 9,
+    'instructor_dashboard (repeat)': 8,
+}
+# Without a shared cache (SNAPSHOT_VERSIONS='database', db sessions), requests
+# pay one query to read the versions and one to load the session
+DATABASE_VERSION_BUDGETS = {
+    'get_game_status': 6,
+    'get_game_status (unchanged)': 2,
+    'get_leaderboard': 3,
+    'get_leaderboard (unchanged)': 1,
+    'submit_round': 10,
+    'berserk_click': 8,
+    'berserk_click (repeat)': 2,
+    'instructor_dashboard': 10,
+    'instructor_dashboard (repeat)': 9,
+}
+# Seconds per request; generous, so only an accidental O(N) loop trips it
+TIME_BUDGET = 0.5
+BUDGET_TEAMS = 300
+BUDGET_QUESTIONS = 10
+BUDGET_ILLEGAL_HITS = 4  # Per team per question
+
+
+@mock.patch.object(berserk, 'BERSERK_WRITE_BEHIND', False)  # Count the press's inserts against its request
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')  # The shared-cache deployment
+class QueryBudgetTests(TestCase):
+    """Hot views stay within a fixed number of queries, whatever the number of teams and logs."""
+
+    versions = 'cache'
+    budgets = QUERY_BUDGETS
+
+    @classmethod
+    def setUpTestData(cls):
+        teams = Team.objects.bulk_create([
+            Team(
+                team_name=f'Team {n}',
+                primary_member_name='A', primary_member_email=f'a{n}@example.com',
+                supporting_member_name='B', supporting_member_email=f'b{n}@example.com',
+            )
+            for n in range(BUDGET_TEAMS)
+        ])
+        TeamEmail.objects.bulk_create([row for team in teams for row in team.email_rows()])
+        # Clustered scores and close completion times, so ranks need the tie-breaker
+        Round1Score.objects.bulk_create([
+            Round1Score(team=team, score=n % 20 * 5, completion_time=datetime.time(10, n % 60, n % 59))
+            for n, team in enumerate(teams)
+        ])
+        Round2Score.objects.bulk_create([
+            Round2Score(team=team, score=n % 15 * 10, completion_time=datetime.time(11, n % 60, n % 57))
+            for n, team in enumerate(teams)
+        ])
+
+        question_set = QuestionSet.objects.create(round_number=1, version=1)
+        Question.objects.bulk_create([
+            Question(question_set=question_set, number=n, text=f'Q{n}', options=['a', 'b', 'c', 'd'], correct_option=n % 4)
+            for n in range(1, BUDGET_QUESTIONS + 1)
+        ])
+
+        questions = Round3Question.objects.bulk_create([
+            Round3Question(question_text=f'Q{n}', sequence_order=n) for n in range(1, BUDGET_QUESTIONS + 1)
+        ])
+        now = timezone.now()
+        logs = []
+        for question in questions:
+            for n, team in enumerate(teams):
+                logs.append(BerserkLog(team=team, question=question, timestamp=now + datetime.timedelta(microseconds=n)))
+                logs += [
+                    BerserkLog(team=team, question=question, timestamp=now - datetime.timedelta(seconds=1), is_illegal=True)
+                    for _ in range(BUDGET_ILLEGAL_HITS)
+                ]
+        BerserkLog.objects.bulk_create(logs, batch_size=1000)
+
+        cls.teams = teams
+        cls.question = questions[-1]
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        patcher = mock.patch.object(snapshots, 'SNAPSHOT_VERSIONS', self.versions)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.team = self.teams[BUDGET_TEAMS // 2]
+        session = self.client.session
+        session['user_id'] = self.team.id
+        session.save()
+
+    def set_round(self, active_round, round_status='ONGOING', question=None):
+        game_state = GameState.load()
+        game_state.active_round = active_round
+        game_state.round_status = round_status
+        game_state.current_round3_question = question
+        game_state.save()
+
+    def assertWithinBudget(self, label, request, status=200):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status, label)
+        self.assertLessEqual(len(ctx.captured_queries), self.budgets[label], f"{label} queries:\n" + '\n'.join(q['sql'] for q in ctx.captured_queries))
+        self.assertLess(elapsed, TIME_BUDGET, label)
+        return response
+
+    def test_get_game_status(self):
+        self.set_round(3, question=self.question)  # Qualification needs the round 2 rank
+        url = reverse('get_game_status')
+        response = self.assertWithinBudget('get_game_status', lambda: self.client.get(url))
+        self.assertWithinBudget('get_game_status (unchanged)', lambda: self.client.get(url, headers={'If-None-Match': response['ETag']}), status=304)
+
+    def test_get_leaderboard(self):
+        self.set_round(3, question=self.question)
+        url = reverse('get_leaderboard')
+        response = self.assertWithinBudget('get_leaderboard', lambda: self.client.get(url))
+        self.assertEqual(len(response.json()['leaderboard']), 10)
+        self.assertWithinBudget('get_leaderboard (unchanged)', lambda: self.client.get(url, headers={'If-None-Match': response['ETag']}), status=304)
+
+    def test_submit_round(self):
+        self.set_round(1)
+        Round1Score.objects.filter(team=self.team).delete()
+        body = json.dumps({'round': 1, 'answers': [n % 4 for n in range(1, BUDGET_QUESTIONS + 1)], 'submission_id': 'budget'})
+        response = self.assertWithinBudget('submit_round', lambda: self.client.post(reverse('submit_round'), body, content_type='application/json'))
+        self.assertEqual(response.json()['score'], BUDGET_QUESTIONS * 10)
+
+    def test_berserk_click(self):
+        question = Round3Question.objects.create(question_text='Fresh', sequence_order=BUDGET_QUESTIONS + 1, is_active=True, activated_at=timezone.now())
+        self.set_round(3, question=question)
+        url = reverse('berserk_click')
+        response = self.assertWithinBudget('berserk_click', lambda: self.client.post(url))
+        self.assertEqual(response.json()['message'], 'Berserk Recorded!')
+        self.assertWithinBudget('berserk_click (repeat)', lambda: self.client.post(url))
+
+    def test_instructor_dashboard(self):
+        self.set_round(3, question=self.question)
+        self.client.force_login(self.admin)
+        url = reverse('instructor_dashboard')
+        self.assertWithinBudget('instructor_dashboard', lambda: self.client.get(url))
+        self.assertWithinBudget('instructor_dashboard (repeat)', lambda: self.client.get(url))
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')  # The per-process cache deployment
+class DatabaseVersionQueryBudgetTests(QueryBudgetTests):
+    versions = 'database'
+    budgets = DATABASE_VERSION_BUDGETS
+
+    def test_write_without_a_bump_changes_the_etag(self):
+        # As when another worker process, with its own cache, did the write
+        self.set_round(2)
+        url = reverse('get_game_status')
+        response = self.client.get(url)
+        GameState.objects.filter(pk=1).update(round_status='DONE', updated_at=timezone.now())
+        Round1Score.objects.filter(team=self.team).update(score=0, updated_at=timezone.now())
+
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['round_status'], 'DONE')
+        self.assertEqual(response.json()['last_score'], 0)
+
+
+class SubmitRoundTests(TestCase):
+    """Retried submissions are scored once, and both answer formats score the same."""
+
+    QUESTIONS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        question_set = QuestionSet.objects.create(round_number=1, version=1)
+        Question.objects.bulk_create([
+            Question(question_set=question_set, number=n, text=f'Q{n}', options=['a', 'b', 'c', 'd'], correct_option=n % 4)
+            for n in range(1, cls.QUESTIONS + 1)
+        ])
+        cls.team = make_team(0)
+
+    def setUp(self):
+        cache.clear()
+        session = self.client.session
+        session['user_id'] = self.team.id
+        session.save()
+
+    def submit(self, answers, submission_id='retry-me'):
+        body = {'round': 1, 'answers': answers, 'submission_id': submission_id}
+        return self.client.post(reverse('submit_round'), json.dumps(body), content_type='application/json')
+
+    def test_retry_returns_the_original_result(self):
+        first = self.submit([n % 4 for n in range(1, self.QUESTIONS + 1)])
+        self.assertEqual(first.json()['score'], 100)
+        self.assertNotIn('Idempotent-Replayed', first)
+        saved = Round1Score.objects.get(team=self.team)
+
+        # Different answers under the same token: still the first submission's result
+        retry = self.submit([0] * self.QUESTIONS)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Round1Score.objects.get(team=self.team).completion_time, saved.completion_time)
+
+    def test_duplicate_in_progress_is_409(self):
+        # Another request is scoring this submission right now
+        cache.add(submission_key(self.team.id, 1, 'retry-me') + ':lock', 1, 30)
+        response = self.submit([0] * self.QUESTIONS)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Round1Score.objects.filter(team=self.team).exists())
+
+    def test_retry_after_cache_loss_uses_the_saved_submission(self):
+        first = self.submit([n % 4 for n in range(1, self.QUESTIONS + 1)])
+        saved = Round1Score.objects.get(team=self.team)
+        cache.clear()
+
+        retry = self.submit([0] * self.QUESTIONS)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['score'], first.json()['score'])
+        score = Round1Score.objects.get(team=self.team)
+        self.assertEqual((score.score, score.completion_time), (saved.score, saved.completion_time))
+
+        # A new submission is scored afresh
+        self.assertEqual(self.submit([0] * self.QUESTIONS, 'second-attempt').json()['score'], 20)
+
+    def test_any_token_makes_a_valid_cache_key(self):
+        token = 'a token\twith spaces, \x00 and ünïcode'
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            first = self.submit([0] * self.QUESTIONS, token)
+            retry = self.submit([1] * self.QUESTIONS, token)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+
+    def test_invalid_round_takes_no_lock(self):
+        body = {'round': 7, 'answers': [], 'submission_id': 'retry-me'}
+        response = self.client.post(reverse('submit_round'), json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(cache.get(submission_key(self.team.id, 7, 'retry-me') + ':lock'))
+        # Nor is one held afterwards for a valid round
+        self.assertEqual(self.submit([0] * self.QUESTIONS).status_code, 200)
+
+    def test_compact_and_full_payloads_score_the_same(self):
+        cases = {
+            'all correct': [n % 4 for n in range(1, self.QUESTIONS + 1)],
+            'all wrong': [(n + 1) % 4 for n in range(1, self.QUESTIONS + 1)],
+            'mixed': [n % 4 if n % 3 else (n + 2) % 4 for n in range(1, self.QUESTIONS + 1)],
+            'some unanswered': [n % 4 if n % 2 else -1 for n in range(1, self.QUESTIONS + 1)],
+            'short': [1, 2, 3],
+        }
+        for name, compact in cases.items():
+            with self.subTest(name):
+                full = [{'question_id': n, 'selected_option': option} for n, option in enumerate(compact, 1) if option != -1]
+                compact_score = self.submit(compact, f'compact-{name}').json()['score']
+                full_score = self.submit(full, f'full-{name}').json()['score']
+                self.assertEqual(compact_score, full_score)
+
+
+class VersionQueryTests(TestCase):
+    """The database-mode version query for every version group, and what moves each version."""
+
+    def test_every_group_builds_a_union_of_text_stamps(self):
+        names = list(snapshots.VERSION_SOURCES)
+        groups = [[name] for name in names] + [names]
+        for group in groups:
+            with self.subTest(group=group):
+                query = snapshots.version_query(group)
+                sql = str(query.query)
+                # Mixed column types (ids, timestamps) only UNION on PostgreSQL once cast to one type
+                self.assertEqual(sql.count('CAST(MAX('), len({s for name in group for s in snapshots.VERSION_SOURCES[name]}))
+                rows = list(query)
+                self.assertTrue(all(stamp is None or isinstance(stamp, str) for _, _, stamp in rows))
+                self.assertEqual(len(snapshots._database_versions(group)), len(group))
+
+    def test_berserk_version_follows_logs_and_questions(self):
+        team = make_team(0)
+        before = snapshots._database_versions([snapshots.BERSERK])
+        question = Round3Question.objects.create(question_text='Q1', sequence_order=1)
+        after_question = snapshots._database_versions([snapshots.BERSERK])
+        BerserkLog.objects.create(team=team, question=question)
+        after_log = snapshots._database_versions([snapshots.BERSERK])
+        self.assertEqual(len({before, after_question, after_log}), 3)
+
+
+class RankTests(TestCase):
+    """get_rank against the ordering the old list-index ranking used."""
+
+    def setUp(self):
+        self.teams = [make_team(n) for n in range(8)]
+
+    def score(self, n, score, completion_time):
+        return Round1Score.objects.create(team=self.teams[n], score=score, completion_time=completion_time)
+
+    def ranks(self):
+        return [get_rank(Round1Score, team)[0] for team in self.teams if Round1Score.objects.filter(team=team).exists()]
+
+    def test_matches_old_ordering_without_ties(self):
+        for n, (score, minute) in enumerate([(50, 5), (80, 9), (80, 3), (20, 1), (50, 2)]):
+            self.score(n, score, datetime.time(10, minute))
+        old_order = [s.team_id for s in Round1Score.objects.order_by('-score', 'completion_time')]
+        for team in self.teams[:5]:
+            self.assertEqual(get_rank(Round1Score, team), (old_order.index(team.id) + 1, team.r1_score.score))
+
+    def test_ties_share_a_rank(self):
+        same_time = datetime.time(10, 5, 0, 250000)
+        self.score(0, 90, datetime.time(10, 1))
+        self.score(1, 70, same_time)
+        self.score(2, 70, same_time)
+        self.score(3, 50, datetime.time(10, 2))
+        self.assertEqual(self.ranks(), [1, 2, 2, 4])
+
+    def test_missing_completion_time_ranks_behind_same_score(self):
+        self.score(0, 70, None)
+        self.score(1, 70, datetime.time(10, 9))
+        self.score(2, 60, datetime.time(10, 0))
+        self.score(3, 70, None)
+        self.assertEqual(self.ranks(), [2, 1, 4, 2])
+
+    def test_team_without_score_has_no_rank(self):
+        self.assertEqual(get_rank(Round1Score, self.teams[0]), (None, None))
+
+
+class QualificationTests(TestCase):
+    """The dashboard's Round 3 teams are exactly those /api/game/status/ calls qualified."""
+
+    CUTOFF = QUALIFICATION_CUTOFFS[3]
+
+    def setUp(self):
+        cache.clear()
+        self.teams = [make_team(n) for n in range(self.CUTOFF + 4)]
+        # Places 1-8 distinct; 9-11 tied on score and time across the cutoff; then the same
+        # score without a time (ranked behind), and a lower score
+        for n in range(self.CUTOFF - 2):
+            Round2Score.objects.create(team=self.teams[n], score=200 - n * 10, completion_time=datetime.time(11, n))
+        for n in range(self.CUTOFF - 2, self.CUTOFF + 1):
+            Round2Score.objects.create(team=self.teams[n], score=100, completion_time=datetime.time(11, 30))
+        Round2Score.objects.create(team=self.teams[self.CUTOFF + 1], score=100, completion_time=None)
+        Round2Score.objects.create(team=self.teams[self.CUTOFF + 2], score=10, completion_time=datetime.time(11, 0))
+        # No Round 2 score at all: self.teams[CUTOFF + 3]
+        game_state = GameState.load()
+        game_state.active_round = 3
+        game_state.save()
+
+    def status(self, team):
+        session = self.client.session
+        session['user_id'] = team.id
+        session.save()
+        return self.client.get(reverse('get_game_status')).json()
+
+    def test_tie_at_the_cutoff_qualifies_every_tied_team(self):
+        qualified = [s.team_id for s in qualified_scores(Round2Score, 3)]
+        self.assertEqual(qualified, [team.id for team in self.teams[:self.CUTOFF + 1]])
+        for team in self.teams:
+            with self.subTest(team=team.team_name):
+                self.assertEqual(self.status(team)['is_qualified'], team.id in qualified)
+
+    def test_dashboard_seeds_round3_for_the_same_teams(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        self.client.get(reverse('instructor_dashboard'))
+        self.assertEqual(
+            set(Round3Score.objects.values_list('team_id', flat=True)),
+            {s.team_id for s in qualified_scores(Round2Score, 3)},
+        )
+
+    def test_fewer_teams_than_places(self):
+        Round2Score.objects.filter(team__in=self.teams[3:]).delete()
+        self.assertEqual(len(qualified_scores(Round2Score, 3)), 3)
+
+
+PROMETHEUS_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*",?)*\})? (\S+)$')
+
+
+@override_settings(METRICS_TOKEN='scrape-me')
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def scrape(self, **extra):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me', **extra)
+
+    def test_anonymous_and_wrong_token_are_forbidden(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            # No token configured: an empty bearer must not match
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_bearer_token_and_superuser_are_allowed(self):
+        self.assertEqual(self.scrape().status_code, 200)
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_middleware_records_each_view(self):
+        GameState.load()
+        self.client.get(reverse('get_game_status'))
+        self.client.get(reverse('get_game_status'))
+        self.client.get(reverse('get_leaderboard'))
+
+        views = {row['view']: row for row in metrics.snapshot()['views']}
+        self.assertEqual(views['get_game_status']['requests'], 2)
+        self.assertEqual(views['get_leaderboard']['requests'], 1)
+        status = metrics._views['get_game_status']
+        self.assertEqual(status.latency.count, 2)
+        self.assertEqual(status.queries.count, 2)
+        self.assertGreater(status.queries.sum, 0)
+        self.assertEqual(sum(status.statuses.values()), 2)
+
+    def test_prometheus_text_is_well_formed(self):
+        GameState.load()
+        self.client.get(reverse('get_game_status'))
+        response = self.scrape()
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertTrue(text.endswith('\n'))
+
+        types = {}
+        buckets = []
+        for line in text.splitlines():
+            if line.startswith('# TYPE '):
+                _, _, name, kind = line.split(' ')
+                self.assertIn(kind, ('counter', 'gauge', 'histogram', 'summary'))
+                self.assertNotIn(name, types, 'family declared twice')
+                types[name] = kind
+                continue
+            if line.startswith('# HELP '):
+                continue
+            match = PROMETHEUS_SAMPLE.match(line)
+            self.assertIsNotNone(match, line)
+            float(match.group(3))
+            family = re.sub(r'_(bucket|sum|count)$', '', match.group(1))
+            self.assertTrue(match.group(1) in types or family in types, f'undeclared sample: {line}')
+            if match.group(1) == 'techquiz_http_request_duration_seconds_bucket' and 'view="get_game_status"' in line:
+                buckets.append(float(match.group(3)))
+
+        self.assertEqual(buckets, sorted(buckets), 'histogram buckets must be cumulative')
+        self.assertIn('le="+Inf"} 1', text)
+        self.assertIn('techquiz_http_request_duration_seconds_count{view="get_game_status"} 1', text)
+
+    def test_json_format(self):
+        GameState.load()
+        self.client.get(reverse('get_game_status'))
+        data = self.scrape(QUERY_STRING='format=json').json()
+        self.assertEqual(set(data), {'since', 'now', 'views'})
+        row = next(row for row in data['views'] if row['view'] == 'get_game_status')
+        self.assertEqual(row['requests'], 1)
+        self.assertEqual(row['errors'], 0)
+
+
+class EventStreamTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        GameState.load()
+
+    def test_wsgi_gets_204_so_eventsource_stops(self):
+        response = self.client.get(reverse('event_stream'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+    async def read_events(self, channels):
+        """Opens a stream over ASGI and returns the names of the events in its first burst."""
+        response = await self.async_client.get(reverse('event_stream'), {'channels': channels})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        names = []
+        try:
+            self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+            for _ in channels.split(','):
+                chunk = (await asyncio.wait_for(anext(chunks), 5)).decode()
+                names.append(chunk.split('\n')[0].removeprefix('event: '))
+        finally:
+            await chunks.aclose()
+        return names
+
+    async def test_only_the_requested_channels_are_sent(self):
+        self.assertEqual(await self.read_events('leaderboard'), ['leaderboard'])
+        self.assertEqual(await self.read_events('status,question'), ['status', 'question'])
+
+    async def test_unknown_channels_send_nothing(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.read_events('bogus'), 0.5)
+
+
+class CacheCheckTests(SimpleTestCase):
+    """The system checks refuse per-process caches where workers must share state."""
+
+    LOCMEM = {'default': {'BACKEND': 'api.cache.LocMemCache'}}
+    REDIS = {'default': {'BACKEND': 'api.cache.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}
+
+    def test_berserk_counters(self):
+        cases = [(1, self.LOCMEM, []), (4, self.LOCMEM, ['api.E003']), (4, self.REDIS, [])]
+        for workers, caches, expected in cases:
+            with self.subTest(workers=workers, backend=caches['default']['BACKEND']), override_settings(WEB_WORKERS=workers, CACHES=caches):
+                self.assertEqual([e.id for e in checks.check_berserk_counters(None)], expected)
+
+    def test_snapshot_versions(self):
+        cases = [('database', self.LOCMEM, []), ('cache', self.LOCMEM, ['api.E002']), ('cache', self.REDIS, []), ('both', self.REDIS, ['api.E001'])]
+        for versions, caches, expected in cases:
+            with self.subTest(versions=versions, backend=caches['default']['BACKEND']), override_settings(SNAPSHOT_VERSIONS=versions, CACHES=caches):
+                self.assertEqual([e.id for e in checks.check_snapshot_versions(None)], expected)
+
+
+class BuzzerMessageTests(SimpleTestCase):
+    """Frames the buzzer ignores instead of crashing the connection."""
+
+    def handle(self, text):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        connection = BuzzerConnection(1, send)
+        now = time.perf_counter_ns()
+        asyncio.run(connection.handle(text, now, now))
+        return sent
+
+    def test_non_object_frames_are_ignored(self):
+        for text in ('[]', '1', '"press"', 'null', 'not json'):
+            with self.subTest(text=text):
+                self.assertEqual(self.handle(text), [])
+
+    def test_pong_without_ping_is_ignored(self):
+        self.assertEqual(self.handle('{"type": "pong", "id": 7}'), [])
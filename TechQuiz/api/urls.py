@@ -6,4 +6,5 @@ urlpatterns = [
     path('game/status/', views.get_game_status, name='get_game_status'),
     path('leaderboard/', views.get_leaderboard, name='get_leaderboard'),
     path('quiz/berserk/', views.berserk_click, name='berserk_click'),
+    path('events/', views.event_stream, name='event_stream'),
 ]
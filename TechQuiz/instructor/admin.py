@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import GameState, Round1Score, Round2Score, Round3Score, Round3Question, BerserkLog
+from .models import GameState, Round1Score, Round2Score, Round3Score, Round3Question, BerserkLog, QuestionSet, Question
 
 @admin.register(GameState)
 class GameStateAdmin(admin.ModelAdmin):
@@ -30,3 +30,13 @@ class BerserkLogAdmin(admin.ModelAdmin):
     list_filter = ('question', 'is_illegal')
     readonly_fields = ('timestamp',)
     search_fields = ('team__team_name',)
+
+class QuestionInline(admin.TabularInline):
+    model = Question
+    extra = 0
+
+@admin.register(QuestionSet)
+class QuestionSetAdmin(admin.ModelAdmin):
+    list_display = ('round_number', 'version', 'is_active', 'source', 'created_at')
+    list_filter = ('round_number', 'is_active')
+    inlines = [QuestionInline]
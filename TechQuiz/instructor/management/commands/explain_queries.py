@@ -0,0 +1,71 @@
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import berserk, leaderboard
+from api.ranking import rows_ahead
+from instructor.models import Round1Score, Round2Score, Round3Score, Round3Question
+
+# Plan lines that mean a table is read end to end, or rows are sorted after being read
+FULL_SCAN = re.compile(r'\bSCAN \S+$|Seq Scan on')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+def hot_queries(team_id, question_id):
+    """The queries the polling and berserk endpoints run, as (label, queryset)."""
+    sample_time = datetime.time(0, 10)
+    queries = []
+    for score_model in (Round1Score, Round2Score):
+        name = score_model.__name__
+        queries += [
+            (f'status: own {name} row', score_model.objects.filter(team_id=team_id).values_list('score', 'completion_time')),
+            (f'status: {name} rank count', rows_ahead(score_model, 50, sample_time).values('id')),
+            (f'status: {name} rank count (no time)', rows_ahead(score_model, 50, None).values('id')),
+            (f'leaderboard: {name} top {leaderboard.LEADERBOARD_SIZE}', leaderboard.top_scores(score_model)),
+        ]
+    queries += [
+        ('leaderboard: round 3 first legal hits', leaderboard.first_legal_hits(question_id)),
+        ('berserk: legal hit teams', berserk.legal_hit_teams(question_id)),
+        ('berserk: illegal hit counts', berserk.illegal_hit_counts(question_id)),
+        ('dashboard: Round3Score standings', Round3Score.objects.order_by('-score')),
+    ]
+    return queries
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on each hot API query and reports whether it is served by an index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strict', action='store_true', help='Exit with an error if any query scans a table or sorts in memory')
+
+    def handle(self, *args, **options):
+        question = Round3Question.objects.order_by('id').first()
+        score = Round1Score.objects.order_by('id').first()
+        queries = hot_queries(score.team_id if score else 1, question.id if question else 1)
+
+        problems = []
+        for label, queryset in queries:
+            plan = queryset.explain().splitlines()
+            issues = []
+            if any(FULL_SCAN.search(line) for line in plan):
+                issues.append('full scan')
+            if any(TEMP_SORT.search(line) for line in plan):
+                issues.append('sort')
+
+            if issues:
+                problems.append(label)
+                self.stdout.write(self.style.WARNING(f"NO INDEX  {label} ({', '.join(issues)})"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"INDEXED   {label}"))
+            if issues or options['verbosity'] > 1:
+                for line in plan:
+                    self.stdout.write(f"          {line}")
+
+        if connection.vendor == 'postgresql':
+            self.stdout.write("Note: PostgreSQL may prefer sequential scans on small tables; run against realistic data.")
+
+        if problems and options['strict']:
+            raise CommandError(f"{len(problems)} hot queries are not served by an index: {', '.join(problems)}")
+        self.stdout.write(f"{len(queries) - len(problems)}/{len(queries)} hot queries use an index.")
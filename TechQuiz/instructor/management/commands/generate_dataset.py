@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import events, snapshots
+from instructor import synthetic
+from registration_n_login.models import TeamEmail
+
+
+class Command(BaseCommand):
+    help = "Generates a reproducible synthetic event (teams, round 1/2 scores, round 3 questions and berserk logs) for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Same seed and sizes, same data')
+        parser.add_argument('--teams', type=int, default=2000, help='Registered teams, all of which play Round 1')
+        parser.add_argument('--round2-teams', type=int, default=None, help='Top Round 1 teams that play Round 2 (default: all)')
+        parser.add_argument('--round3-teams', type=int, default=None, help='Top Round 2 teams that play Round 3 (default: all Round 2 teams)')
+        parser.add_argument('--quiz-questions', type=int, default=10, help='Questions per quiz round, which sets the score range')
+        parser.add_argument('--completion-spread', type=float, default=20, help='Mean seconds between quiz completion times')
+        parser.add_argument('--round3-questions', type=int, default=10, help='Round 3 questions, each with a berserk burst')
+        parser.add_argument('--presses', type=int, default=5, help='Berserk presses per team per question')
+        parser.add_argument('--jitter', type=float, default=0.15, help='Spread of the presses around each unlock, in seconds')
+        parser.add_argument('--batch-size', type=int, default=synthetic.BATCH_SIZE, help='Rows per INSERT')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated synthetic data first')
+
+    def handle(self, *args, **options):
+        if options['teams'] < 1:
+            raise CommandError('--teams must be at least 1')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            if options['flush']:
+                teams, questions = synthetic.delete_synthetic()
+                self.stdout.write(f"Deleted {teams} synthetic teams and {questions} synthetic questions.")
+            elif TeamEmail.objects.filter(email__endswith=f'@{synthetic.SYNTHETIC_DOMAIN}').exists():
+                raise CommandError('Synthetic data already exists; run with --flush to replace it.')
+
+            teams = synthetic.generate_teams(options['teams'], rng, batch_size)
+            self.stdout.write(f"Created {len(teams)} teams.")
+
+            round1 = synthetic.generate_scores(1, teams, rng, options['quiz_questions'], options['completion_spread'], batch_size)
+            round2_teams = self.top_teams(round1, options['round2_teams'])
+            round2 = synthetic.generate_scores(2, round2_teams, rng, options['quiz_questions'], options['completion_spread'], batch_size)
+            self.stdout.write(f"Created {len(round1)} Round 1 and {len(round2)} Round 2 scores.")
+
+            round3_teams = self.top_teams(round2, options['round3_teams'])
+            questions, logs = synthetic.generate_round3(
+                round3_teams, rng, options['round3_questions'], options['presses'], options['jitter'], batch_size=batch_size,
+            )
+            self.stdout.write(f"Created {len(questions)} Round 3 questions and {logs} berserk logs from {len(round3_teams)} teams.")
+
+            # bulk_create skips the post_save version bumps
+            for name in (snapshots.SCORES, snapshots.BERSERK, snapshots.QUESTIONS):
+                snapshots.bump_version(name)
+            transaction.on_commit(events.notify)
+
+        self.stdout.write(self.style.SUCCESS(f"Generated dataset (seed {options['seed']}) in {time.perf_counter() - started:.1f}s."))
+
+    def top_teams(self, scores, count):
+        """Teams of the best `count` score rows (all if count is None), in rank order."""
+        ranked = sorted(scores, key=lambda s: (-s.score, s.completion_time))
+        return [s.team for s in ranked[:count]]
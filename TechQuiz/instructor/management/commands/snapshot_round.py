@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from instructor.question_bank import snapshot_round
+
+
+class Command(BaseCommand):
+    help = "Freezes a round's questions into the database as a new QuestionSet version."
+
+    def add_arguments(self, parser):
+        parser.add_argument('round', type=int, choices=[1, 2], help='Round number to snapshot')
+
+    def handle(self, *args, **options):
+        round_num = options['round']
+        question_set = snapshot_round(round_num)
+        if question_set is None:
+            raise CommandError(f"Could not load questions for Round {round_num}; nothing was snapshotted.")
+
+        count = question_set.questions.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshotted Round {round_num} as v{question_set.version} ({count} questions)."
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instructor', '0005_gamestate_current_round3_question_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('round_number', models.IntegerField(choices=[(1, 'Round 1'), (2, 'Round 2')])),
+                ('version', models.PositiveIntegerField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['round_number', '-version'],
+                'indexes': [models.Index(fields=['round_number', 'is_active'], name='questionset_round_active_idx')],
+                'constraints': [models.UniqueConstraint(fields=('round_number', 'version'), name='unique_questionset_version')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('text', models.TextField()),
+                ('options', models.JSONField()),
+                ('correct_option', models.IntegerField()),
+                ('question_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='instructor.questionset')),
+            ],
+            options={
+                'ordering': ['question_set', 'number'],
+                'constraints': [models.UniqueConstraint(fields=('question_set', 'number'), name='unique_question_number')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instructor', '0006_questionset_question'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='berserklog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
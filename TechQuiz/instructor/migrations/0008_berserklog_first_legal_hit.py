@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+def drop_duplicate_legal_hits(apps, schema_editor):
+    # Keep the earliest legal hit per team/question; later ones never counted
+    BerserkLog = apps.get_model('instructor', 'BerserkLog')
+    legal = BerserkLog.objects.filter(is_illegal=False)
+    ordered = legal.order_by('team_id', 'question_id', 'timestamp', 'id')
+    seen = set()
+    duplicates = []
+    for log_id, team_id, question_id in ordered.values_list('id', 'team_id', 'question_id'):
+        if (team_id, question_id) in seen:
+            duplicates.append(log_id)
+        seen.add((team_id, question_id))
+    BerserkLog.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instructor', '0007_berserklog_timestamp_default'),
+        ('registration_n_login', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_legal_hits, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='berserklog',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_illegal', False)), fields=('team', 'question'), name='berserklog_first_legal_hit'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instructor', '0008_berserklog_first_legal_hit'),
+        ('registration_n_login', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='berserklog',
+            index=models.Index(condition=models.Q(('is_illegal', False)), fields=['question', 'timestamp', 'team'], name='berserklog_legal_hits_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='berserklog',
+            index=models.Index(condition=models.Q(('is_illegal', True)), fields=['question', 'team'], name='berserklog_illegal_hits_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round1score',
+            index=models.Index(fields=['-score', 'completion_time'], name='round1score_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round2score',
+            index=models.Index(fields=['-score', 'completion_time'], name='round2score_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round3score',
+            index=models.Index(fields=['-score', 'completion_time'], name='round3score_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instructor', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round1score',
+            name='submission_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='round2score',
+            name='submission_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from registration_n_login.models import Team
 
 class GameState(models.Model):
@@ -36,6 +37,14 @@ class Round1Score(models.Model):
     team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name='r1_score')
     score = models.IntegerField(default=0)
     completion_time = models.TimeField(null=True, blank=True)
+    submission_id = models.CharField(max_length=64, blank=True) # Client token of the submission that set this score
+    updated_at = models.DateTimeField(auto_now=True) # Snapshot version source (api.snapshots)
+
+    class Meta:
+        indexes = [
+            # Leaderboard order and rank counts (score desc, completion time asc)
+            models.Index(fields=['-score', 'completion_time'], name='round1score_rank_idx'),
+        ]
 
     def __str__(self):
         return f"{self.team.team_name} - {self.score}"
@@ -44,6 +53,14 @@ class Round2Score(models.Model):
     team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name='r2_score')
     score = models.IntegerField(default=0)
     completion_time = models.TimeField(null=True, blank=True)
+    submission_id = models.CharField(max_length=64, blank=True) # Client token of the submission that set this score
+    updated_at = models.DateTimeField(auto_now=True) # Snapshot version source (api.snapshots)
+
+    class Meta:
+        indexes = [
+            # Leaderboard order and rank counts (score desc, completion time asc)
+            models.Index(fields=['-score', 'completion_time'], name='round2score_rank_idx'),
+        ]
 
     def __str__(self):
         return f"{self.team.team_name} - {self.score}"
@@ -52,6 +69,13 @@ class Round3Score(models.Model):
     team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name='r3_score')
     score = models.IntegerField(default=0)
     completion_time = models.TimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True) # Snapshot version source (api.snapshots)
+
+    class Meta:
+        indexes = [
+            # Leaderboard order and rank counts (score desc, completion time asc)
+            models.Index(fields=['-score', 'completion_time'], name='round3score_rank_idx'),
+        ]
 
     def __str__(self):
         return f"{self.team.team_name} - {self.score}"
@@ -61,6 +85,7 @@ class Round3Question(models.Model):
     sequence_order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=False)
     activated_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True) # Snapshot version source (api.snapshots)
     
     def __str__(self):
         return f"Q{self.sequence_order}: {self.question_text} ({'Active' if self.is_active else 'Locked'})"
@@ -68,8 +93,61 @@ class Round3Question(models.Model):
 class BerserkLog(models.Model):
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='berserk_logs')
     question = models.ForeignKey(Round3Question, on_delete=models.CASCADE, related_name='logs')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now) # Set to the press arrival time
     is_illegal = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Leaderboard: a question's legal hits in press order
+            models.Index(fields=['question', 'timestamp', 'team'], condition=models.Q(is_illegal=False), name='berserklog_legal_hits_idx'),
+            # Illegal-hit counts per team for a question
+            models.Index(fields=['question', 'team'], condition=models.Q(is_illegal=True), name='berserklog_illegal_hits_idx'),
+        ]
+        constraints = [
+            # Only a team's first legal hit per question is ever stored
+            models.UniqueConstraint(
+                fields=['team', 'question'],
+                condition=models.Q(is_illegal=False),
+                name='berserklog_first_legal_hit',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.team.team_name} - {'ILLEGAL' if self.is_illegal else 'VALID'} - {self.timestamp.strftime('%H:%M:%S.%f')}"
+
+
+class QuestionSet(models.Model):
+    """A frozen, versioned copy of a round's question sheet."""
+    round_number = models.IntegerField(choices=GameState.ROUND_CHOICES[:2])
+    version = models.PositiveIntegerField()
+    is_active = models.BooleanField(default=True)
+    source = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['round_number', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['round_number', 'version'], name='unique_questionset_version'),
+        ]
+        indexes = [
+            models.Index(fields=['round_number', 'is_active'], name='questionset_round_active_idx'),
+        ]
+
+    def __str__(self):
+        return f"Round {self.round_number} v{self.version} ({'Active' if self.is_active else 'Archived'})"
+
+class Question(models.Model):
+    question_set = models.ForeignKey(QuestionSet, on_delete=models.CASCADE, related_name='questions')
+    number = models.IntegerField()  # The id the frontend submits answers against
+    text = models.TextField()
+    options = models.JSONField()
+    correct_option = models.IntegerField()
+
+    class Meta:
+        ordering = ['question_set', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['question_set', 'number'], name='unique_question_number'),
+        ]
+
+    def __str__(self):
+        return f"Q{self.number}: {self.text}"
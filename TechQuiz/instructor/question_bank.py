@@ -0,0 +1,264 @@
+"""
+Question bank cache for Rounds 1 and 2.
+
+Questions are served from a per-process memory layer first, then from the
+shared Django cache, and only fetched from the question source on a full miss.
+Entries past their TTL are served stale while a background thread refreshes
+them, so page renders and scoring never wait on Google Sheets once warm.
+
+Once a round has been snapshotted (see snapshot_round), the frozen copy in the
+database is the source of truth and the configured question source (see
+question_sources) is no longer consulted.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, connections, transaction
+
+from .question_sources import get_source
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'question_bank:round{}'
+
+# Seconds a fetched question list is considered fresh
+QUESTION_BANK_TTL = getattr(settings, 'QUESTION_BANK_TTL', 300)
+# Extra seconds a stale list may be served while it is refreshed
+QUESTION_BANK_STALE_TTL = getattr(settings, 'QUESTION_BANK_STALE_TTL', 3600)
+# Seconds a process trusts its own copy before re-reading the shared cache
+QUESTION_BANK_LOCAL_TTL = getattr(settings, 'QUESTION_BANK_LOCAL_TTL', 10)
+# Seconds an empty (failed) fetch is remembered, to avoid hammering the source
+QUESTION_BANK_EMPTY_TTL = 5
+# Tries at a snapshot when a concurrent one takes the same version number
+SNAPSHOT_ATTEMPTS = 3
+
+_local = {}  # round_num -> (entry, local_until)
+_round_locks = {1: threading.Lock(), 2: threading.Lock()}
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+_stats = {
+    'local_hits': 0,
+    'shared_hits': 0,
+    'stale_hits': 0,
+    'misses': 0,
+    'refreshes': 0,
+    'errors': 0,
+}
+
+
+def _fetch_from_source(round_num):
+    return get_source(round_num).load()
+
+
+def load_snapshot(round_num):
+    """Returns the active snapshot for a round, or None if it has not been frozen."""
+    from .models import Question
+
+    rows = Question.objects.filter(
+        question_set__round_number=round_num,
+        question_set__is_active=True,
+    ).order_by('number').values_list('number', 'text', 'options', 'correct_option')
+
+    questions = [
+        {'id': number, 'q': text, 'options': options, 'correct': correct}
+        for number, text, options, correct in rows
+    ]
+    return questions or None
+
+
+def _fetch(round_num):
+    questions = load_snapshot(round_num)
+    if questions is not None:
+        return questions
+    return _fetch_from_source(round_num)
+
+
+def _version(questions):
+    payload = json.dumps(questions, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+
+def _store(round_num, questions, previous=None):
+    """Publishes a freshly fetched list to both cache layers and returns the entry."""
+    now = time.time()
+
+    if not questions:
+        _stats['errors'] += 1
+        if previous and previous['questions']:
+            # Source hiccup: keep serving the last good copy
+            return previous
+        entry = {
+            'version': None,
+            'questions': [],
+            'fresh_until': now + QUESTION_BANK_EMPTY_TTL,
+            'stale_until': now + QUESTION_BANK_EMPTY_TTL,
+        }
+        _local[round_num] = (entry, now + QUESTION_BANK_EMPTY_TTL)
+        return entry
+
+    entry = {
+        'version': _version(questions),
+        'questions': questions,
+        'fresh_until': now + QUESTION_BANK_TTL,
+        'stale_until': now + QUESTION_BANK_TTL + QUESTION_BANK_STALE_TTL,
+    }
+    cache.set(CACHE_KEY.format(round_num), entry, QUESTION_BANK_TTL + QUESTION_BANK_STALE_TTL)
+    _local[round_num] = (entry, now + QUESTION_BANK_LOCAL_TTL)
+    return entry
+
+
+def _refresh_in_background(round_num, previous):
+    with _refreshing_lock:
+        if round_num in _refreshing:
+            return
+        _refreshing.add(round_num)
+
+    def run():
+        try:
+            close_old_connections()
+            _stats['refreshes'] += 1
+            _store(round_num, _fetch(round_num), previous)
+        except Exception:
+            logger.exception("Question bank refresh failed for round %s", round_num)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(round_num)
+            # The thread ends here: don't leave its connection open
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'question-bank-refresh-{round_num}', daemon=True).start()
+
+
+def _serve(round_num, entry, now):
+    if now >= entry['fresh_until']:
+        _stats['stale_hits'] += 1
+        _refresh_in_background(round_num, entry)
+    return entry
+
+
+def get_question_bank(round_num):
+    """
+    Returns the cached entry for a round: a dict with 'version' (content hash)
+    and 'questions' (the parsed question list, including correct answers).
+    """
+    now = time.time()
+
+    local = _local.get(round_num)
+    if local and now < local[1] and now < local[0]['stale_until']:
+        _stats['local_hits'] += 1
+        return _serve(round_num, local[0], now)
+
+    entry = cache.get(CACHE_KEY.format(round_num))
+    if entry and now < entry['stale_until']:
+        _stats['shared_hits'] += 1
+        _local[round_num] = (entry, now + QUESTION_BANK_LOCAL_TTL)
+        return _serve(round_num, entry, now)
+
+    # Full miss: only one thread per process goes to the source
+    with _round_locks[round_num]:
+        local = _local.get(round_num)
+        if local and time.time() < local[1] and time.time() < local[0]['fresh_until']:
+            _stats['local_hits'] += 1
+            return local[0]
+        _stats['misses'] += 1
+        return _store(round_num, _fetch(round_num), entry or (local and local[0]))
+
+
+def get_questions(round_num):
+    """Returns the parsed question list for Round 1 or 2."""
+    return get_question_bank(round_num)['questions']
+
+
+def invalidate(round_num=None):
+    """Drops cached questions for one round (or both) from every cache layer."""
+    rounds = [round_num] if round_num else [1, 2]
+    for r in rounds:
+        _local.pop(r, None)
+        cache.delete(CACHE_KEY.format(r))
+
+
+def refresh(round_num):
+    """Re-fetches a round from its source right now and returns the new entry."""
+    with _round_locks[round_num]:
+        _stats['refreshes'] += 1
+        previous = _local.get(round_num)
+        return _store(round_num, _fetch(round_num), previous and previous[0])
+
+
+def _freeze(round_num, source, questions):
+    """Writes one QuestionSet version; the unique (round, version) constraint rejects a duplicate."""
+    from .models import QuestionSet, Question
+
+    with transaction.atomic():
+        latest = QuestionSet.objects.select_for_update().filter(round_number=round_num).order_by('-version').first()
+        QuestionSet.objects.filter(round_number=round_num, is_active=True).update(is_active=False)
+        question_set = QuestionSet.objects.create(
+            round_number=round_num,
+            version=(latest.version + 1) if latest else 1,
+            source=source.describe()[:255],
+        )
+        Question.objects.bulk_create([
+            Question(
+                question_set=question_set,
+                number=q['id'],
+                text=q['q'],
+                options=q['options'],
+                correct_option=q['correct'],
+            )
+            for q in questions
+        ])
+    return question_set
+
+
+def snapshot_round(round_num):
+    """
+    Imports the round's question source once and freezes it as a new active
+    QuestionSet. Returns the new QuestionSet, or None if nothing could be read.
+    """
+    source = get_source(round_num)
+    questions = source.load()
+    if not questions:
+        return None
+
+    for attempt in range(SNAPSHOT_ATTEMPTS):
+        try:
+            question_set = _freeze(round_num, source, questions)
+            break
+        except IntegrityError:
+            # A concurrent snapshot of this round took the version number first
+            if attempt == SNAPSHOT_ATTEMPTS - 1:
+                raise
+
+    invalidate(round_num)
+    return question_set
+
+
+def has_snapshot(round_num):
+    from .models import QuestionSet
+    return QuestionSet.objects.filter(round_number=round_num, is_active=True).exists()
+
+
+def get_stats():
+    """Process-local hit/miss counters, plus what each round currently holds."""
+    from .models import QuestionSet
+
+    snapshots = dict(QuestionSet.objects.filter(is_active=True).values_list('round_number', 'version'))
+    stats = dict(_stats)
+    lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 3) if lookups else None
+    stats['rounds'] = {}
+    for r in (1, 2):
+        local = _local.get(r)
+        stats['rounds'][r] = {
+            'version': local[0]['version'] if local else None,
+            'count': len(local[0]['questions']) if local else 0,
+            'snapshot': snapshots.get(r),
+        }
+    return stats
+
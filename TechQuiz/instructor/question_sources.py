@@ -0,0 +1,157 @@
+"""
+Pluggable question sources for Rounds 1 and 2.
+
+Each round reads its questions from the backend configured in
+settings.QUESTION_SOURCES, e.g.
+
+    QUESTION_SOURCES = {
+        1: {'BACKEND': 'sheets', 'SHEET_ID': '...'},
+        2: {'BACKEND': 'csv', 'PATH': 'questions/round2.csv', 'CLAMP': True},
+    }
+
+BACKEND is one of 'sheets', 'csv', 'json', 'yaml', 'file' (picked by the file
+extension) or the dotted path of a QuestionSource subclass. Every backend goes
+through the same row parser as the Google Sheet, so the correct option can be
+written as a number, a letter, "option N" or the option text.
+"""
+import csv
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .sheets import load_question_sheet, parse_question_rows
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionSource:
+    """Base class: load() returns the parsed question list (empty on failure)."""
+
+    def __init__(self, clamp=False, **options):
+        self.clamp = clamp
+        self.options = options
+
+    def load(self):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class GoogleSheetSource(QuestionSource):
+    def __init__(self, sheet_id, **kwargs):
+        super().__init__(**kwargs)
+        self.sheet_id = sheet_id
+
+    def load(self):
+        return load_question_sheet(self.sheet_id, clamp=self.clamp)
+
+    def describe(self):
+        return f'sheet:{self.sheet_id}'
+
+
+class FileSource(QuestionSource):
+    """Base for local files. Paths are relative to BASE_DIR unless absolute."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = os.path.join(settings.BASE_DIR, path)
+
+    def read_rows(self, f):
+        raise NotImplementedError
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8', newline='') as f:
+                rows = self.read_rows(f)
+        except Exception as e:
+            logger.error("Error reading questions from %s: %s", self.path, e)
+            return []
+        return parse_question_rows(rows, clamp=self.clamp)
+
+    def describe(self):
+        return f'file:{self.path}'
+
+
+def _records_to_rows(records):
+    """
+    Accepts either sheet-style rows (lists) or records like
+    {"question": ..., "options": [a, b, c, d], "correct": ...}.
+    """
+    if isinstance(records, dict):
+        records = records.get('questions', [])
+
+    rows = []
+    for record in records:
+        if isinstance(record, dict):
+            options = list(record.get('options', []))[:4]
+            options += [''] * (4 - len(options))
+            rows.append([str(record.get('question', ''))] + [str(o) for o in options] + [str(record.get('correct', ''))])
+        else:
+            rows.append([str(value) for value in record])
+    return rows
+
+
+class CSVSource(FileSource):
+    def read_rows(self, f):
+        return list(csv.reader(f))
+
+
+class JSONSource(FileSource):
+    def read_rows(self, f):
+        return _records_to_rows(json.load(f))
+
+
+class YAMLSource(FileSource):
+    def read_rows(self, f):
+        import yaml # PyYAML is only needed when a YAML source is configured
+        return _records_to_rows(yaml.safe_load(f) or [])
+
+
+BACKENDS = {
+    'sheets': GoogleSheetSource,
+    'csv': CSVSource,
+    'json': JSONSource,
+    'yaml': YAMLSource,
+}
+
+FILE_EXTENSIONS = {
+    '.csv': CSVSource,
+    '.json': JSONSource,
+    '.yaml': YAMLSource,
+    '.yml': YAMLSource,
+}
+
+
+def _default_config(round_num):
+    if round_num == 1:
+        from round_1.utils import SHEET_ID
+        return {'BACKEND': 'sheets', 'SHEET_ID': SHEET_ID}
+    if round_num == 2:
+        from round_2.utils import SHEET_ID
+        return {'BACKEND': 'sheets', 'SHEET_ID': SHEET_ID, 'CLAMP': True}
+    raise ValueError(f'No question source for round {round_num}')
+
+
+def get_source(round_num):
+    """Builds the configured QuestionSource for a round."""
+    config = getattr(settings, 'QUESTION_SOURCES', {}).get(round_num) or _default_config(round_num)
+    backend = config.get('BACKEND', 'sheets')
+    clamp = config.get('CLAMP', False)
+
+    if backend == 'file':
+        ext = os.path.splitext(config['PATH'])[1].lower()
+        if ext not in FILE_EXTENSIONS:
+            raise ValueError(f"Unsupported question file type '{ext}' for round {round_num}")
+        return FILE_EXTENSIONS[ext](config['PATH'], clamp=clamp)
+
+    source_class = BACKENDS.get(backend) or import_string(backend)
+    if issubclass(source_class, GoogleSheetSource):
+        return source_class(config['SHEET_ID'], clamp=clamp)
+    if issubclass(source_class, FileSource):
+        return source_class(config['PATH'], clamp=clamp)
+    options = {k.lower(): v for k, v in config.items() if k not in ('BACKEND', 'CLAMP')}
+    return source_class(clamp=clamp, **options)
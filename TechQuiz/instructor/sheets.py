@@ -0,0 +1,215 @@
+"""
+Shared Google Sheets access for the question rounds.
+
+The authorized gspread client is built once per process and reused, so its
+HTTP session (and the TLS connections in its pool) survive between calls.
+Tokens that are close to expiry are refreshed on a background thread instead
+of inside the request that happens to notice.
+"""
+import datetime
+import logging
+import os
+import threading
+import traceback
+
+import gspread
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+from google.oauth2.credentials import Credentials
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+
+# Refresh tokens this long before they actually expire
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+POOL_SIZE = 20
+
+_client = None
+_credentials = None
+_client_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_worksheets = {}  # sheet_id -> first worksheet of that spreadsheet
+
+
+def _find_token_file():
+    potential_paths = [
+        os.path.join(settings.BASE_DIR, 'token.json'),
+        os.path.join(settings.BASE_DIR, 'TechQuiz', 'token.json'), # Check inner folder explicitly
+        os.path.join(os.getcwd(), 'token.json'),
+    ]
+    for path in potential_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _load_credentials():
+    service_account_path = os.path.join(settings.BASE_DIR, 'service_account.json')
+    if os.path.exists(service_account_path):
+        try:
+            creds = service_account.Credentials.from_service_account_file(service_account_path, scopes=SCOPES)
+            logger.info("Authenticated with Service Account at %s", service_account_path)
+            return creds
+        except Exception as e:
+            logger.warning("Service Account auth failed: %s", e)
+
+    # Fallback to User Auth (token.json)
+    token_path = _find_token_file()
+    if not token_path:
+        logger.error("token.json NOT FOUND in any expected location and service_account.json missing!")
+        return None
+
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    if creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+    logger.info("Authenticated with user token at %s", token_path)
+    return creds
+
+
+def _refresh_soon(creds):
+    """Kicks off a background token refresh when the current one is about to expire."""
+    if not creds.expiry or creds.expiry - datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) > REFRESH_MARGIN:
+        return
+    if not _refresh_lock.acquire(blocking=False):
+        return # Already refreshing
+
+    def run():
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            logger.warning("Background token refresh failed: %s", e)
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='sheets-token-refresh', daemon=True).start()
+
+
+def get_client():
+    """Returns the process-wide authorized gspread client, or None if no credentials exist."""
+    global _client, _credentials
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                creds = _load_credentials()
+                if creds is None:
+                    return None
+                session = AuthorizedSession(creds)
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                _credentials = creds
+                _client = gspread.authorize(creds, session=session)
+
+    _refresh_soon(_credentials)
+    return _client
+
+
+def reset_client():
+    """Drops the cached client so the next call re-authenticates."""
+    global _client, _credentials
+    with _client_lock:
+        _client = None
+        _credentials = None
+        _worksheets.clear()
+
+
+# First-row cells that mark a header row rather than a question
+HEADER_CELLS = {'question', 'questions', 'question text'}
+HEADER_OPTIONS = ['option 1', 'option 2', 'option 3', 'option 4']
+
+
+def is_header_row(row):
+    """Only known header cells count, so a question that starts with "Question" is kept."""
+    if not row:
+        return False
+    if row[0].strip().lower() in HEADER_CELLS:
+        return True
+    return [cell.strip().lower() for cell in row[1:5]] == HEADER_OPTIONS
+
+
+def parse_question_rows(rows, clamp=False):
+    """
+    Turns raw sheet rows into question dicts compatible with the frontend quizData.
+    Expected Format: question | option 1 | option 2 | option 3 | option 4 | correct option
+    The correct option may be a number (1-4), a letter (A-D), "option N" or the option text.
+    """
+    if not rows:
+        return []
+
+    # Check if first row is header
+    if is_header_row(rows[0]):
+        rows = rows[1:]
+
+    questions = []
+    for index, row in enumerate(rows):
+        if len(row) < 6:
+            continue
+
+        question_text = row[0].strip()
+        if not question_text: # Skip empty rows
+            continue
+
+        options = [row[1], row[2], row[3], row[4]]
+        correct_val = str(row[5]).strip()
+
+        correct_idx = 0
+        if correct_val.isdigit():
+            correct_idx = int(correct_val) - 1
+        elif len(correct_val) == 1 and correct_val.upper() in ['A', 'B', 'C', 'D']:
+            correct_idx = ord(correct_val.upper()) - 65
+        elif correct_val.lower().startswith("option"):
+            try:
+                correct_idx = int(correct_val.split()[-1]) - 1
+            except ValueError:
+                pass
+        else:
+            # Try to find exact text match
+            try:
+                correct_idx = options.index(correct_val)
+            except ValueError:
+                correct_idx = 0 # Default fallback
+
+        if clamp:
+            correct_idx = max(0, min(correct_idx, 3))
+
+        questions.append({
+            "id": index + 1,
+            "q": question_text,
+            "options": options,
+            "correct": correct_idx
+        })
+
+    return questions
+
+
+def load_question_sheet(sheet_id, clamp=False):
+    """
+    Downloads the first worksheet of a spreadsheet and parses it into questions.
+    Returns an empty list if the sheet cannot be reached.
+    """
+    try:
+        client = get_client()
+        if client is None:
+            return []
+
+        worksheet = _worksheets.get(sheet_id)
+        if worksheet is None:
+            # Open by Key (ID) explicitly to avoid Drive API scope requirement
+            try:
+                worksheet = client.open_by_key(sheet_id).sheet1
+            except gspread.SpreadsheetNotFound:
+                logger.error("Spreadsheet %s not found (check ID/Permissions).", sheet_id)
+                return []
+            _worksheets[sheet_id] = worksheet
+
+        return parse_question_rows(worksheet.get_all_values(), clamp=clamp)
+
+    except Exception:
+        logger.error("Error fetching questions from sheet %s:\n%s", sheet_id, traceback.format_exc())
+        # The session or token may be broken; rebuild it on the next call
+        reset_client()
+        return []
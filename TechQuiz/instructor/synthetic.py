@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic event data for scale testing.
+
+Every generator takes a random.Random, so the same seed and sizes always give
+the same rows. Rows are written with bulk_create in batches, which skips
+model signals: callers bump the snapshot versions afterwards (see
+generate_dataset). Synthetic teams use SYNTHETIC_DOMAIN emails and synthetic
+round 3 questions start with SYNTHETIC_PREFIX, so they can be found and
+removed again.
+"""
+import datetime
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.berserk import PENALTY_POINTS, STRIKES_PER_PENALTY
+from api.scoring import ROUND_SCORING
+from registration_n_login.models import Team, TeamEmail
+from .models import BerserkLog, Round1Score, Round2Score, Round3Question, Round3Score
+
+SYNTHETIC_DOMAIN = 'synthetic.example.com'
+SYNTHETIC_PREFIX = 'Synthetic'
+BATCH_SIZE = 1000
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'IT', 'MECH', 'CIVIL']
+YEARS = ['1st Year', '2nd Year', '3rd Year', '4th Year']
+
+# A fixed event day, so timestamps don't depend on when the data was generated
+EVENT_DAY = datetime.date(2026, 1, 1)
+ROUND_ENDS = {1: datetime.time(10, 30), 2: datetime.time(12, 0)}
+ROUND3_START = datetime.time(14, 0)
+
+
+def _phone(rng):
+    return f'9{rng.randrange(10 ** 8, 10 ** 9)}'
+
+
+def generate_teams(count, rng, batch_size=BATCH_SIZE):
+    """Creates `count` teams and their TeamEmail rows. Returns the saved teams."""
+    teams = Team.objects.bulk_create([
+        Team(
+            team_name=f'{SYNTHETIC_PREFIX} Team {n}',
+            primary_member_name=f'Lead {n}', primary_member_email=f'lead{n}@{SYNTHETIC_DOMAIN}',
+            primary_member_phone=_phone(rng), primary_member_dept=rng.choice(DEPARTMENTS), primary_member_year=rng.choice(YEARS),
+            supporting_member_name=f'Second {n}', supporting_member_email=f'second{n}@{SYNTHETIC_DOMAIN}',
+            supporting_member_phone=_phone(rng), supporting_member_dept=rng.choice(DEPARTMENTS), supporting_member_year=rng.choice(YEARS),
+        )
+        for n in range(count)
+    ], batch_size=batch_size)
+    # bulk_create skips Team.save(), so add the lookup rows here
+    TeamEmail.objects.bulk_create([row for team in teams for row in team.email_rows()], batch_size=batch_size)
+    return teams
+
+
+def _completion_time(round_num, rng, spread):
+    """A completion time bunched up just before the round ends, microseconds apart."""
+    end = datetime.datetime.combine(EVENT_DAY, ROUND_ENDS[round_num])
+    return (end - timedelta(seconds=rng.expovariate(1 / spread))).time()
+
+
+def generate_scores(round_num, teams, rng, questions=10, spread=20, batch_size=BATCH_SIZE):
+    """
+    Creates a Round1Score or Round2Score per team. Each team has a skill level,
+    so scores cluster around the middle with many ties; completion times are
+    `spread` seconds apart on average.
+    """
+    score_model = {1: Round1Score, 2: Round2Score}[round_num]
+    points = ROUND_SCORING[round_num]['points']
+    rows = []
+    for team in teams:
+        skill = rng.betavariate(5, 3)
+        correct = sum(rng.random() < skill for _ in range(questions))
+        rows.append(score_model(team=team, score=correct * points, completion_time=_completion_time(round_num, rng, spread)))
+    return score_model.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def generate_round3(teams, rng, questions=10, presses=5, jitter=0.15, interval=120, batch_size=BATCH_SIZE):
+    """
+    Creates `questions` round 3 questions, unlocked `interval` seconds apart, and
+    the berserk logs of `teams` pressing `presses` times each around every
+    unlock (normally distributed, `jitter` seconds wide). Presses before the
+    unlock are illegal; of those after it, only a team's first is logged, as
+    api.berserk does. Round3Score rows carry the false-start penalties.
+    Returns (questions, number of logs).
+    """
+    start = timezone.make_aware(datetime.datetime.combine(EVENT_DAY, ROUND3_START))
+    round3_questions = Round3Question.objects.bulk_create([
+        Round3Question(
+            question_text=f'{SYNTHETIC_PREFIX} question {n}', sequence_order=n,
+            activated_at=start + timedelta(seconds=interval * (n - 1)),
+        )
+        for n in range(1, questions + 1)
+    ], batch_size=batch_size)
+
+    penalties = dict.fromkeys((team.id for team in teams), 0)
+    logs = []
+    log_count = 0
+    for question in round3_questions:
+        for team in teams:
+            times = sorted(question.activated_at + timedelta(seconds=rng.gauss(jitter / 2, jitter)) for _ in range(presses))
+            illegal = [t for t in times if t < question.activated_at]
+            logs += [BerserkLog(team=team, question=question, timestamp=t, is_illegal=True) for t in illegal]
+            if len(illegal) < len(times):
+                logs.append(BerserkLog(team=team, question=question, timestamp=times[len(illegal)]))
+            penalties[team.id] += len(illegal) // STRIKES_PER_PENALTY * PENALTY_POINTS
+
+            if len(logs) >= batch_size:
+                BerserkLog.objects.bulk_create(logs, batch_size=batch_size)
+                log_count += len(logs)
+                logs = []
+    BerserkLog.objects.bulk_create(logs, batch_size=batch_size)
+    log_count += len(logs)
+
+    Round3Score.objects.bulk_create(
+        [Round3Score(team_id=team_id, score=-penalty) for team_id, penalty in penalties.items()],
+        batch_size=batch_size,
+    )
+    return round3_questions, log_count
+
+
+def delete_synthetic():
+    """
+    Removes synthetic teams (with their scores and logs) and synthetic round 3
+    questions. Returns the number of teams and questions deleted.
+    """
+    _, teams = Team.objects.filter(emails__email__endswith=f'@{SYNTHETIC_DOMAIN}', emails__role='PRIMARY').delete()
+    _, questions = Round3Question.objects.filter(question_text__startswith=SYNTHETIC_PREFIX).delete()
+    return teams.get(Team._meta.label, 0), questions.get(Round3Question._meta.label, 0)
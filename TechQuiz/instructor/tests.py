@@ -1,3 +1,267 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import question_bank
+from .models import QuestionSet
+from .question_sources import CSVSource, JSONSource, YAMLSource, get_source
+from .sheets import parse_question_rows
+
+HEADER = ['Question', 'Option 1', 'Option 2', 'Option 3', 'Option 4', 'Correct Option']
+
+
+class ParseQuestionRowsTests(SimpleTestCase):
+
+    def test_header_row_is_skipped(self):
+        questions = parse_question_rows([HEADER, ['2 + 2?', '3', '4', '5', '6', '2']])
+        self.assertEqual([q['q'] for q in questions], ['2 + 2?'])
+
+    def test_header_with_other_first_cell_is_skipped(self):
+        header = ['Question text (max 200 chars)'] + HEADER[1:]
+        questions = parse_question_rows([header, ['2 + 2?', '3', '4', '5', '6', '2']])
+        self.assertEqual([q['q'] for q in questions], ['2 + 2?'])
+
+    def test_first_question_starting_with_question_is_kept(self):
+        rows = [
+            ['Question 1: which planet is largest?', 'Mars', 'Jupiter', 'Venus', 'Earth', 'B'],
+            ['Which gas do plants absorb?', 'O2', 'N2', 'CO2', 'H2', 'Option 3'],
+        ]
+        questions = parse_question_rows(rows)
+        self.assertEqual([q['q'] for q in questions], [rows[0][0], rows[1][0]])
+        self.assertEqual([q['correct'] for q in questions], [1, 2])
+
+    def test_correct_option_spellings(self):
+        rows = [HEADER] + [['Q', 'a', 'b', 'c', 'd', spelling] for spelling in ['3', 'C', 'option 3', 'c', 'nonsense']]
+        self.assertEqual([q['correct'] for q in parse_question_rows(rows)], [2, 2, 2, 2, 0])
+
+    def test_clamp_keeps_index_in_range(self):
+        rows = [['Q', 'a', 'b', 'c', 'd', '9']]
+        self.assertEqual(parse_question_rows(rows)[0]['correct'], 8)
+        self.assertEqual(parse_question_rows(rows, clamp=True)[0]['correct'], 3)
+
+
+class QuestionSourceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_csv_columns_map_to_question_options_and_answer(self):
+        path = self.write('round.csv', ','.join(HEADER) + '\n2 + 2?,3,4,5,6,2\nCapital of France?,Rome,Paris,Oslo,Bern,B\n')
+        questions = CSVSource(path).load()
+        self.assertEqual([q['q'] for q in questions], ['2 + 2?', 'Capital of France?'])
+        self.assertEqual(questions[0]['options'], ['3', '4', '5', '6'])
+        self.assertEqual([q['correct'] for q in questions], [1, 1])
+
+    def test_json_records_and_rows(self):
+        records = {'questions': [
+            {'question': 'Largest planet?', 'options': ['Mars', 'Jupiter', 'Venus'], 'correct': 'Option 2'},
+            ['Plants absorb?', 'O2', 'N2', 'CO2', 'H2', 'C'],
+        ]}
+        questions = JSONSource(self.write('round.json', json.dumps(records))).load()
+        self.assertEqual([q['q'] for q in questions], ['Largest planet?', 'Plants absorb?'])
+        self.assertEqual(questions[0]['options'], ['Mars', 'Jupiter', 'Venus', ''])
+        self.assertEqual([q['correct'] for q in questions], [1, 2])
+
+    def test_yaml_records(self):
+        text = 'questions:\n  - question: Largest planet?\n    options: [Mars, Jupiter, Venus, Earth]\n    correct: Jupiter\n'
+        questions = YAMLSource(self.write('round.yaml', text)).load()
+        self.assertEqual(questions[0]['options'], ['Mars', 'Jupiter', 'Venus', 'Earth'])
+        self.assertEqual(questions[0]['correct'], 1)
+
+    def test_bad_correct_index(self):
+        path = self.write('round.json', json.dumps([{'question': 'Q', 'options': ['a', 'b', 'c', 'd'], 'correct': 9}]))
+        self.assertEqual(JSONSource(path).load()[0]['correct'], 8)
+        self.assertEqual(JSONSource(path, clamp=True).load()[0]['correct'], 3)
+
+    def test_missing_file_loads_nothing(self):
+        with self.assertLogs('instructor.question_sources', 'ERROR'):
+            self.assertEqual(CSVSource(os.path.join(self.dir, 'missing.csv')).load(), [])
+
+    def test_file_backend_picks_the_source_by_extension(self):
+        path = self.write('round.yml', '[]')
+        with override_settings(QUESTION_SOURCES={2: {'BACKEND': 'file', 'PATH': path, 'CLAMP': True}}):
+            source = get_source(2)
+        self.assertIsInstance(source, YAMLSource)
+        self.assertTrue(source.clamp)
+        with override_settings(QUESTION_SOURCES={2: {'BACKEND': 'file', 'PATH': 'round.txt'}}):
+            with self.assertRaises(ValueError):
+                get_source(2)
+
+
+def make_questions(*texts):
+    return [{'id': i + 1, 'q': text, 'options': ['a', 'b', 'c', 'd'], 'correct': 0} for i, text in enumerate(texts)]
+
+
+def wait_for_refreshes():
+    for thread in threading.enumerate():
+        if thread.name.startswith('question-bank-refresh-'):
+            thread.join(5)
+
+
+class QuestionBankCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        question_bank._local.clear()
+        self.now = 1000.0
+        clock = mock.patch.object(question_bank.time, 'time', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.fetch = mock.Mock(return_value=make_questions('first'))
+        patcher = mock.patch.object(question_bank, '_fetch_from_source', self.fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_local_copy_is_trusted_for_the_local_ttl(self):
+        first = question_bank.get_question_bank(1)
+        # Another process publishes a newer list to the shared cache
+        newer = dict(first, version='newer')
+        cache.set(question_bank.CACHE_KEY.format(1), newer)
+
+        self.now += question_bank.QUESTION_BANK_LOCAL_TTL - 1
+        self.assertEqual(question_bank.get_question_bank(1)['version'], first['version'])
+        self.now += 2
+        self.assertEqual(question_bank.get_question_bank(1)['version'], 'newer')
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_shared_cache_serves_a_process_without_a_local_copy(self):
+        first = question_bank.get_question_bank(1)
+        question_bank._local.clear()
+        self.assertEqual(question_bank.get_question_bank(1), first)
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_stale_entry_is_served_while_a_background_refresh_runs(self):
+        first = question_bank.get_question_bank(1)
+        self.fetch.return_value = make_questions('second')
+
+        self.now += question_bank.QUESTION_BANK_TTL + 1
+        self.assertEqual(question_bank.get_question_bank(1)['questions'], first['questions'])
+        wait_for_refreshes()
+
+        self.assertEqual(question_bank.get_questions(1), make_questions('second'))
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_expired_entry_is_fetched_again(self):
+        question_bank.get_question_bank(1)
+        self.fetch.return_value = make_questions('second')
+        self.now += question_bank.QUESTION_BANK_TTL + question_bank.QUESTION_BANK_STALE_TTL + 1
+        self.assertEqual(question_bank.get_questions(1), make_questions('second'))
+
+    def test_failed_fetch_keeps_the_last_good_copy(self):
+        question_bank.get_question_bank(1)
+        self.fetch.return_value = []
+        self.assertEqual(question_bank.refresh(1)['questions'], make_questions('first'))
+
+    def test_refresh_and_invalidate_drop_the_cached_copy(self):
+        question_bank.get_question_bank(1)
+        self.fetch.return_value = make_questions('second')
+        self.assertEqual(question_bank.refresh(1)['questions'], make_questions('second'))
+        self.assertEqual(question_bank.get_questions(1), make_questions('second'))
+
+        self.fetch.return_value = make_questions('third')
+        question_bank.invalidate(1)
+        self.assertIsNone(cache.get(question_bank.CACHE_KEY.format(1)))
+        self.assertEqual(question_bank.get_questions(1), make_questions('third'))
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        question_bank._local.clear()
+        self.source = mock.Mock(describe=mock.Mock(return_value='test'))
+        self.source.load.return_value = make_questions('first', 'second')
+        patcher = mock.patch.object(question_bank, 'get_source', return_value=self.source)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot_versions_and_replaces_the_active_set(self):
+        self.assertFalse(question_bank.has_snapshot(1))
+        first = question_bank.snapshot_round(1)
+        second = question_bank.snapshot_round(1)
+        first.refresh_from_db()
+
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertFalse(first.is_active)
+        self.assertTrue(second.is_active)
+        self.assertTrue(question_bank.has_snapshot(1))
+        self.assertFalse(question_bank.has_snapshot(2))
+
+    def test_snapshot_is_served_instead_of_the_source(self):
+        question_bank.snapshot_round(1)
+        self.source.load.return_value = make_questions('changed')
+        self.assertEqual(question_bank.get_questions(1), make_questions('first', 'second'))
+
+    def test_empty_source_makes_no_snapshot(self):
+        self.source.load.return_value = []
+        self.assertIsNone(question_bank.snapshot_round(1))
+        self.assertFalse(QuestionSet.objects.exists())
+
+    def test_version_is_unique_per_round(self):
+        QuestionSet.objects.create(round_number=1, version=1)
+        QuestionSet.objects.create(round_number=2, version=1)
+        with self.assertRaises(IntegrityError):
+            QuestionSet.objects.create(round_number=1, version=1)
+
+
+class ConcurrentSnapshotTests(TransactionTestCase):
+
+    def test_concurrent_snapshots_get_distinct_versions(self):
+        source = mock.Mock(describe=mock.Mock(return_value='test'))
+        source.load.return_value = make_questions('first')
+        threads = 4
+        start = threading.Barrier(threads)
+        errors = []
+
+        def snapshot():
+            start.wait()
+            try:
+                question_bank.snapshot_round(1)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with mock.patch.object(question_bank, 'get_source', return_value=source):
+            workers = [threading.Thread(target=snapshot) for _ in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+
+        self.assertEqual(errors, [])
+        versions = QuestionSet.objects.filter(round_number=1).values_list('version', flat=True)
+        self.assertEqual(sorted(versions), list(range(1, threads + 1)))
+        self.assertEqual(QuestionSet.objects.filter(round_number=1, is_active=True).count(), 1)
+
+    def test_a_taken_version_is_retried(self):
+        source = mock.Mock(describe=mock.Mock(return_value='test'))
+        source.load.return_value = make_questions('first')
+        real_freeze = question_bank._freeze
+
+        def racing_freeze(round_num, source, questions):
+            if not QuestionSet.objects.exists():
+                # Another snapshot commits version 1 after this one read the latest version
+                with mock.patch.object(QuestionSet.objects, 'select_for_update', return_value=QuestionSet.objects.none()):
+                    QuestionSet.objects.create(round_number=round_num, version=1)
+                    return real_freeze(round_num, source, questions)
+            return real_freeze(round_num, source, questions)
+
+        with mock.patch.object(question_bank, 'get_source', return_value=source), \
+                mock.patch.object(question_bank, '_freeze', racing_freeze):
+            question_set = question_bank.snapshot_round(1)
+        self.assertEqual(question_set.version, 2)
@@ -4,7 +4,12 @@ from django.contrib import messages
 from django.utils import timezone
 from .forms import GameStateForm
 from .models import GameState, Round3Score, Round3Question
+from . import question_bank
 from registration_n_login.models import Team
+from registration_n_login import throttle
+from api import snapshots, events, metrics
+from api.scoring import adjust_score
+from api.ranking import qualified_scores
 
 def is_admin(user):
     return user.is_superuser
@@ -16,22 +21,33 @@ def instructor_dashboard(request):
     # Imports for Round 3 Logic
     from .models import Round3Question, Round3Score, Round1Score, Round2Score, BerserkLog
     
-    # Identify Qualified Teams (Top 10 from Round 2)
-    r2_scores = Round2Score.objects.select_related('team').order_by('-score', 'completion_time')
-    qualified_teams_r2 = [s.team for s in r2_scores[:10]] # Top 10
-    
-    # Ensure R3Score objects exist for all qualified teams
-    for team in qualified_teams_r2:
-        Round3Score.objects.get_or_create(team=team)
+    # Identify Qualified Teams (Top 10 from Round 2, ties at the cutoff included, as /api/game/status/ ranks them)
+    qualified_teams_r2 = [s.team for s in qualified_scores(Round2Score, 3).select_related('team')]
     
+    # Ensure R3Score objects exist for all qualified teams (one query once they all do)
+    scored = set(Round3Score.objects.filter(team__in=qualified_teams_r2).values_list('team_id', flat=True))
+    missing = [Round3Score(team=team) for team in qualified_teams_r2 if team.id not in scored]
+    if missing:
+        Round3Score.objects.bulk_create(missing, ignore_conflicts=True)
+        snapshots.bump_version(snapshots.SCORES) # Bulk create skips post_save
+        events.notify()
 
-    scores = Round3Score.objects.filter(team__in=qualified_teams_r2).order_by('-score')
+    scores = Round3Score.objects.filter(team__in=qualified_teams_r2).select_related('team').order_by('-score')
 
 
     if request.method == 'POST':
         if 'active_round' in request.POST: # Game State Update
             form = GameStateForm(request.POST, instance=game_state)
             if form.is_valid():
+                # Freeze the question sheet before a round goes live, so scoring
+                # never depends on the sheet (or edits to it) mid-round
+                if game_state.round_status == 'ONGOING' and game_state.active_round in (1, 2) \
+                        and not question_bank.has_snapshot(game_state.active_round):
+                    question_set = question_bank.snapshot_round(game_state.active_round)
+                    if question_set:
+                        messages.info(request, f"Snapshotted Round {question_set.round_number} questions as v{question_set.version}.")
+                    else:
+                        messages.warning(request, f"Could not snapshot Round {game_state.active_round} questions; serving the live sheet.")
                 form.save()
                 messages.success(request, f"Game State Updated: Round {game_state.active_round} is now {game_state.round_status}")
                 return redirect('instructor_dashboard')
@@ -39,7 +55,29 @@ def instructor_dashboard(request):
         else: # Round 3 Actions
             action = request.POST.get('action')
             
-            if action == 'activate_question':
+            if action == 'refresh_questions':
+                try:
+                    round_num = int(request.POST.get('round'))
+                    entry = question_bank.refresh(round_num)
+                    if entry['questions']:
+                        messages.success(request, f"Reloaded {len(entry['questions'])} questions for Round {round_num}.")
+                    else:
+                        messages.warning(request, f"Could not load questions for Round {round_num}.")
+                except (ValueError, TypeError, KeyError):
+                    messages.warning(request, "Invalid round for question refresh.")
+
+            elif action == 'snapshot_questions':
+                try:
+                    round_num = int(request.POST.get('round'))
+                    question_set = question_bank.snapshot_round(round_num)
+                    if question_set:
+                        messages.success(request, f"Snapshotted Round {round_num} questions as v{question_set.version}.")
+                    else:
+                        messages.warning(request, f"Could not load questions for Round {round_num}.")
+                except (ValueError, TypeError, KeyError):
+                    messages.warning(request, "Invalid round for question snapshot.")
+
+            elif action == 'activate_question':
                 q_id = request.POST.get('question_id')
                 Round3Question.objects.update(is_active=False) 
                 q = Round3Question.objects.get(id=q_id)
@@ -55,7 +93,10 @@ def instructor_dashboard(request):
                     current.save()
                     messages.info(request, "Question Locked.")
                 else:
-                    Round3Question.objects.update(is_active=False)
+                    Round3Question.objects.update(is_active=False, updated_at=timezone.now())
+                    snapshots.bump_version(snapshots.QUESTIONS) # Bulk update skips post_save
+                    snapshots.bump_version(snapshots.BERSERK)
+                    events.notify()
                     messages.info(request, "System Locked.")
 
             elif action == 'toggle_activation': # New Action: Unlock/Lock
@@ -130,9 +171,7 @@ def instructor_dashboard(request):
                     points = 0
                     
                 team = Team.objects.get(id=team_id)
-                score_obj, created = Round3Score.objects.get_or_create(team=team)
-                score_obj.score += points
-                score_obj.save()
+                adjust_score(Round3Score, team.id, points)
                 messages.success(request, f"Updated score for {team.team_name} by {points}.")
             
             return redirect('instructor_dashboard')
@@ -146,7 +185,10 @@ def instructor_dashboard(request):
 
         'scores': scores,
         'active_question': game_state.current_round3_question, # Current Selected
-        'teams': qualified_teams_r2
+        'teams': qualified_teams_r2,
+        'question_bank': question_bank.get_stats(),
+        'otp': throttle.get_stats(),
+        'metrics': metrics.snapshot(),
     }
             
     return render(request, 'instructor/dashboard.html', context)
\ No newline at end of file
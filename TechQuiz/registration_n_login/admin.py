@@ -1,9 +1,23 @@
+from django import forms
 from django.contrib import admin
 
-from .models import Team
+from .models import OutboundEmail, Team, TeamEmail, normalize_email
+
+
+class TeamAdminForm(forms.ModelForm):
+    def clean(self):
+        cleaned_data = super().clean()
+        # Team.save() would refuse these; report them on the form instead
+        emails = {normalize_email(cleaned_data.get(f)) for f in ('primary_member_email', 'supporting_member_email')}
+        conflicts = set(TeamEmail.objects.filter(email__in=emails).exclude(team_id=self.instance.pk).values_list('email', flat=True))
+        if conflicts:
+            raise forms.ValidationError(f"Already registered by another team: {', '.join(sorted(conflicts))}")
+        return cleaned_data
+
 
 @admin.register(Team)
 class TeamAdmin(admin.ModelAdmin):
+    form = TeamAdminForm
     list_display = (
         'team_name', 
         'primary_member_dept', 
@@ -16,3 +30,11 @@ class TeamAdmin(admin.ModelAdmin):
     )
     search_fields = ('team_name', 'primary_member_name', 'primary_member_email')
     list_filter = ('primary_member_dept', 'primary_member_year', 'created_at')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RegisterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'registration_n_login'
+
+    def ready(self):
+        from . import checks # Registers the system checks
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.compatibility)
+def check_email_sending(app_configs, **kwargs):
+    if not getattr(settings, 'EMAIL_SEND_ON_COMMIT', True) and not getattr(settings, 'EMAIL_QUEUE_THREAD', False):
+        return [Warning(
+            "Queued email (login OTPs included) is only sent when `manage.py send_queued_email` runs.",
+            hint="Keep `send_queued_email --loop` running, or set EMAIL_SEND_ON_COMMIT=True.",
+            id='registration_n_login.W001',
+        )]
+    return []
@@ -0,0 +1,23 @@
+"""Email content sent to teams. Delivery goes through registration_n_login.outbox."""
+
+
+def registration_email(team):
+    """Returns (subject, message, recipient_list) for a team's registration confirmation."""
+    subject = 'TechQuiz: Team Registration Successful'
+    message = (
+        f"Dear Team {team.team_name},\n\n"
+        f"Greetings from the Tech Innovation & Creativity Club!\n\n"
+        f"We are pleased to inform you that your registration for the TechQuiz Competition has been successfully confirmed. 🎉\n"
+        f"Thank you for showing enthusiasm and interest in participating—your curiosity and competitive spirit are exactly what "
+        f"TechQuiz is designed to celebrate.\n\n"
+        f"To ensure smooth communication regarding competition updates, schedules, rules, and announcements, "
+        f"all registered teams are required to join the official TechQuiz WhatsApp Channel using the link provided below:\n\n"
+        f"🔗 WhatsApp Channel Link: https://chat.whatsapp.com/J6EoNG9UOEN9G5H0mY4USg\n\n"
+        f"Please make sure that at least one team representative joins the channel at the earliest to avoid missing any important information.\n\n"
+        f"If you have any queries or require assistance, feel free to reach out to us through the WhatsApp channel or contact to 7387 47 7279.\n\n"
+        f"We look forward to your active participation and wish Team {team.team_name} the very best for the competition.\n\n"
+        f"Warm regards,\n"
+        f"Tech Innovation and Creativity Club\n"
+    )
+    recipient_list = [team.primary_member_email, team.supporting_member_email]
+    return subject, message, recipient_list
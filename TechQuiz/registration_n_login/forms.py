@@ -1,5 +1,5 @@
 from django import forms
-from .models import Team
+from .models import Team, TeamEmail, normalize_email
 
 class TeamRegistrationForm(forms.ModelForm):
     class Meta:
@@ -31,20 +31,14 @@ class TeamRegistrationForm(forms.ModelForm):
         primary_email = cleaned_data.get('primary_member_email')
         supporting_email = cleaned_data.get('supporting_member_email')
 
-        # Check Primary Email
-        if primary_email:
-            if Team.objects.filter(primary_member_email=primary_email).exists() or \
-               Team.objects.filter(supporting_member_email=primary_email).exists():
-                raise forms.ValidationError(f"The email '{primary_email}' is already registered.")
+        # Check both emails against every registered member in one indexed query
+        taken = TeamEmail.taken([e for e in (primary_email, supporting_email) if e])
+        for email in (primary_email, supporting_email):
+            if email and normalize_email(email) in taken:
+                raise forms.ValidationError(f"The email '{email}' is already registered.")
 
-        # Check Supporting Email
-        if supporting_email:
-            if Team.objects.filter(primary_member_email=supporting_email).exists() or \
-               Team.objects.filter(supporting_member_email=supporting_email).exists():
-                raise forms.ValidationError(f"The email '{supporting_email}' is already registered.")
-        
         # Check if they are the same
-        if primary_email and supporting_email and primary_email == supporting_email:
+        if primary_email and supporting_email and normalize_email(primary_email) == normalize_email(supporting_email):
             raise forms.ValidationError("Primary and Supporting members cannot have the same email.")
 
         return cleaned_data
@@ -0,0 +1,101 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from registration_n_login import outbox
+from registration_n_login.emails import registration_email
+from registration_n_login.models import Team, TeamEmail, normalize_email
+
+REQUIRED_COLUMNS = ['team_name', 'primary_member_name', 'primary_member_email', 'supporting_member_name', 'supporting_member_email']
+OPTIONAL_COLUMNS = [
+    'primary_member_phone', 'primary_member_dept', 'primary_member_year',
+    'supporting_member_phone', 'supporting_member_dept', 'supporting_member_year',
+]
+EMAIL_COLUMNS = ['primary_member_email', 'supporting_member_email']
+
+
+class Command(BaseCommand):
+    help = "Imports pre-registered teams from a CSV file (columns as on the registration form) and emails them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV with a header row: ' + ', '.join(REQUIRED_COLUMNS + OPTIONAL_COLUMNS))
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without saving or emailing')
+        parser.add_argument('--no-email', action='store_true', help="Don't send registration confirmations")
+        parser.add_argument('--queue-only', action='store_true', help='Queue the confirmations for the outbox worker instead of sending them now')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+                if missing:
+                    raise CommandError(f"CSV is missing columns: {', '.join(missing)}")
+                rows = list(reader)
+        except OSError as e:
+            raise CommandError(f"Could not read {options['csv_file']}: {e}")
+
+        teams, skipped = self.build_teams(rows)
+        for line, reason in skipped:
+            self.stdout.write(self.style.WARNING(f"Line {line}: skipped, {reason}"))
+
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {len(teams)} teams would be imported, {len(skipped)} skipped.")
+            return
+
+        with transaction.atomic():
+            created = Team.objects.bulk_create(teams, batch_size=options['batch_size'])
+            # bulk_create skips Team.save(), so add the lookup rows here
+            TeamEmail.objects.bulk_create(
+                [row for team in created for row in team.email_rows()],
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(created)} teams, skipped {len(skipped)}."))
+
+        if options['no_email'] or not created:
+            return
+        queued = outbox.queue_emails((registration_email(team) for team in created), batch_size=options['batch_size'])
+        if options['queue_only']:
+            self.stdout.write(f"Queued {queued} confirmation emails.")
+            return
+        sent, failed = outbox.send_pending()
+        self.stdout.write(f"Sent {sent} confirmation emails, {failed} failed (retried later by the outbox worker).")
+
+    def build_teams(self, rows):
+        """Validates rows and drops duplicate emails. Returns (unsaved teams, [(line, reason)])."""
+        emails = [normalize_email(row.get(column)) for row in rows for column in EMAIL_COLUMNS]
+        taken = TeamEmail.taken([e for e in emails if e])
+
+        teams, skipped = [], []
+        seen = set()
+        for line, row in enumerate(rows, 2):  # Line 1 is the header
+            values = {c: (row.get(c) or '').strip() for c in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+            for column in EMAIL_COLUMNS:
+                values[column] = normalize_email(values[column])
+
+            blank = [c for c in REQUIRED_COLUMNS if not values[c]]
+            if blank:
+                skipped.append((line, f"missing {', '.join(blank)}"))
+                continue
+            try:
+                for column in EMAIL_COLUMNS:
+                    validate_email(values[column])
+            except ValidationError:
+                skipped.append((line, f"invalid email '{values[column]}'"))
+                continue
+
+            primary, supporting = values['primary_member_email'], values['supporting_member_email']
+            if primary == supporting:
+                skipped.append((line, "primary and supporting members have the same email"))
+                continue
+            duplicate = next((e for e in (primary, supporting) if e in taken or e in seen), None)
+            if duplicate:
+                skipped.append((line, f"email '{duplicate}' is already registered"))
+                continue
+
+            seen.update((primary, supporting))
+            teams.append(Team(**{c: (v or None) if c in OPTIONAL_COLUMNS else v for c, v in values.items()}))
+        return teams, skipped
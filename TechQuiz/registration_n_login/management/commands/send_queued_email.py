@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from registration_n_login import outbox
+
+
+class Command(BaseCommand):
+    help = "Sends queued emails from the outbox. Run it every minute from cron, or use --loop to run as a long-lived worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, checking for due mail every few seconds')
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE, help='Messages sent per SMTP connection')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.send_pending(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"Sent {sent}, failed {failed}.")
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(outbox.POLL_INTERVAL)
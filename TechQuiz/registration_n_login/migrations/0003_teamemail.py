@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:29
+
+import sys
+
+import django.db.models.deletion
+from django.core.management.color import color_style
+from django.db import migrations, models
+
+COLLISION_WARNING = """
+TeamEmail: {email} is registered more than once. It stays with team {kept} "{kept_name}"
+({kept_role}); update the email of these registrations in the admin:
+{others}
+"""
+
+
+def fill_team_emails(apps, schema_editor):
+    Team = apps.get_model('registration_n_login', 'Team')
+    TeamEmail = apps.get_model('registration_n_login', 'TeamEmail')
+    owners = {}  # email -> [(team id, name, role)], earliest team first
+    for team in Team.objects.order_by('id'):
+        for email, role in ((team.primary_member_email, 'PRIMARY'), (team.supporting_member_email, 'SUPPORTING')):
+            owners.setdefault((email or '').strip().lower(), []).append((team.id, team.team_name, role))
+
+    # An email registered twice (e.g. differing only in case) keeps its earliest team; report the rest
+    style = color_style()
+    for email, members in owners.items():
+        if len(members) > 1:
+            (kept, kept_name, kept_role), others = members[0], members[1:]
+            sys.stdout.write(style.WARNING(COLLISION_WARNING.format(
+                email=email, kept=kept, kept_name=kept_name, kept_role=kept_role,
+                others='\n'.join(f'  team {team_id} "{name}" ({role})' for team_id, name, role in others),
+            )))
+    TeamEmail.objects.bulk_create([
+        TeamEmail(email=email, team_id=members[0][0], role=members[0][2]) for email, members in owners.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration_n_login', '0002_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=254, unique=True)),
+                ('role', models.CharField(choices=[('PRIMARY', 'Primary Member'), ('SUPPORTING', 'Supporting Member')], max_length=10)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='registration_n_login.team')),
+            ],
+        ),
+        migrations.RunPython(fill_team_emails, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 
 class Team(models.Model):
     team_name = models.CharField(max_length=100)
@@ -18,5 +20,111 @@ class Team(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_emails()
+
+    def email_rows(self):
+        """Unsaved TeamEmail rows for this team's members."""
+        return [
+            TeamEmail(email=normalize_email(self.primary_member_email), team=self, role='PRIMARY'),
+            TeamEmail(email=normalize_email(self.supporting_member_email), team=self, role='SUPPORTING'),
+        ]
+
+    def conflicting_emails(self):
+        """This team's member emails (normalized) that another team already uses."""
+        others = TeamEmail.objects.filter(email__in={row.email for row in self.email_rows()})
+        if self.pk:
+            others = others.exclude(team=self)
+        return set(others.values_list('email', flat=True))
+
+    def sync_emails(self):
+        """
+        Brings the TeamEmail rows in line with the member emails. Raises
+        ValidationError, rolling back the save, if another team has one of them.
+        """
+        conflicts = self.conflicting_emails()
+        if conflicts:
+            raise ValidationError(f"Already registered by another team: {', '.join(sorted(conflicts))}")
+        rows = self.email_rows()
+        current = {(e.email, e.role) for e in rows}
+        stale = [e.id for e in self.emails.all() if (e.email, e.role) not in current]
+        TeamEmail.objects.filter(id__in=stale).delete()
+        for row in rows:
+            try:
+                TeamEmail.objects.get_or_create(email=row.email, team=self, defaults={'role': row.role})
+            except IntegrityError:
+                # Another team registered it after the check above
+                raise ValidationError(f"Already registered by another team: {row.email}")
+
     def __str__(self):
         return self.team_name
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+class TeamEmail(models.Model):
+    """
+    Every member email, lowercased, with a unique index. Registration checks and
+    login resolve an email with one indexed lookup here instead of case-insensitive
+    scans over both email columns of Team. Kept in step by Team.save().
+    """
+    ROLE_CHOICES = [
+        ('PRIMARY', 'Primary Member'),
+        ('SUPPORTING', 'Supporting Member'),
+    ]
+
+    email = models.CharField(max_length=254, unique=True)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='emails')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    @classmethod
+    def taken(cls, emails):
+        """The normalized emails from `emails` that some team already uses."""
+        return set(cls.objects.filter(email__in={normalize_email(e) for e in emails}).values_list('email', flat=True))
+
+    @classmethod
+    def find_team(cls, email, role=None):
+        """The team registered with `email` (as the given role, if any), or None."""
+        lookup = cls.objects.select_related('team').filter(email=normalize_email(email))
+        if role:
+            lookup = lookup.filter(role=role)
+        entry = lookup.first()
+        return entry.team if entry else None
+
+    def __str__(self):
+        return f"{self.email} ({self.team.team_name}, {self.role})"
+
+
+class OutboundEmail(models.Model):
+    """An email waiting to be sent (or already sent) by registration_n_login.outbox."""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)  # Worker currently sending it
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "what is due" query
+            models.Index(fields=['status', 'next_attempt_at'], name='outboundemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
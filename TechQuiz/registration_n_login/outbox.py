@@ -0,0 +1,196 @@
+"""
+Outbound email queue for registration and login OTP mail.
+
+Views call queue_email(), which inserts an OutboundEmail row. By default
+(EMAIL_SEND_ON_COMMIT) the web process then sends it as soon as the transaction
+commits, so an OTP goes out straight away and a failing SMTP server only costs
+that request its timeout. Whatever is left due (failures, retrying with
+exponential backoff) is sent by a worker in batches over one SMTP connection,
+recording each message's delivery status.
+
+The worker is `manage.py send_queued_email`, run every minute from cron (or a
+scheduled task), or kept running with --loop. EMAIL_QUEUE_THREAD instead runs
+one as a background thread in each web process, where the server allows
+threads. Rows are claimed before sending, so several senders never send the
+same message.
+"""
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+EMAIL_QUEUE_THREAD = getattr(settings, 'EMAIL_QUEUE_THREAD', False)
+EMAIL_SEND_ON_COMMIT = getattr(settings, 'EMAIL_SEND_ON_COMMIT', True)
+BATCH_SIZE = getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+POLL_INTERVAL = 5  # seconds between checks for retries that have come due
+RETRY_BASE = 30  # seconds; doubles after each failed attempt
+RETRY_MAX = 60 * 60
+# A claim older than this belongs to a worker that died mid-batch
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+_wake = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """Queues an email, sends it once the transaction commits, and returns its OutboundEmail row."""
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.EMAIL_HOST_USER or '',
+        recipients=list(recipient_list),
+    )
+    if EMAIL_QUEUE_THREAD:
+        _ensure_thread()
+        transaction.on_commit(_wake.set)
+    elif EMAIL_SEND_ON_COMMIT:
+        transaction.on_commit(lambda: send_now(email.id))
+    return email
+
+
+def send_now(email_id):
+    """Sends one queued message right away, unless a worker has claimed it. Failures are left to the worker."""
+    worker_id = uuid.uuid4().hex
+    # Same conditional claim as claim_due(), for one row
+    if not OutboundEmail.objects.filter(id=email_id, status='PENDING').update(status='SENDING', claimed_by=worker_id, next_attempt_at=timezone.now()):
+        return 0, 0
+    try:
+        return _send(list(OutboundEmail.objects.filter(id=email_id, claimed_by=worker_id)))
+    except Exception:
+        logger.exception("Error sending email %s; the outbox worker will retry it", email_id)
+        return 0, 1
+
+
+def queue_emails(messages, batch_size=500):
+    """Queues many (subject, message, recipient_list) emails with bulk inserts. Returns the count."""
+    from_email = settings.EMAIL_HOST_USER or ''
+    rows = OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=message, from_email=from_email, recipients=list(recipient_list))
+        for subject, message, recipient_list in messages
+    ], batch_size=batch_size)
+    if rows and EMAIL_QUEUE_THREAD:
+        _ensure_thread()
+        transaction.on_commit(_wake.set)
+    return len(rows)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX))
+
+
+def claim_due(worker_id, batch_size=BATCH_SIZE):
+    """Marks up to batch_size due messages as being sent by worker_id and returns them."""
+    now = timezone.now()
+    # Pending and due, or claimed by a worker that never finished
+    due = OutboundEmail.objects.filter(
+        Q(status='PENDING', next_attempt_at__lte=now) |
+        Q(status='SENDING', next_attempt_at__lte=now - CLAIM_TIMEOUT)
+    )
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    # Conditional update: rows another worker claimed in the meantime no longer match
+    due.filter(id__in=ids).update(status='SENDING', claimed_by=worker_id, next_attempt_at=now)
+    return list(OutboundEmail.objects.filter(id__in=ids, status='SENDING', claimed_by=worker_id).order_by('id'))
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    email.claimed_by = ''
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'FAILED'
+    else:
+        email.status = 'PENDING'
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'claimed_by', 'status', 'next_attempt_at'])
+
+
+def send_batch(batch_size=BATCH_SIZE, worker_id=None):
+    """
+    Sends one batch of due messages over a single SMTP connection.
+    Returns (sent, failed) counts.
+    """
+    emails = claim_due(worker_id or uuid.uuid4().hex, batch_size)
+    if not emails:
+        return 0, 0
+    return _send(emails)
+
+
+def _send(emails):
+    """Sends claimed messages over one SMTP connection. Returns (sent, failed) counts."""
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error("Error opening mail connection: %s", e)
+        for email in emails:
+            _record_failure(email, e)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email, email.recipients, connection=connection)
+            try:
+                # One message per call so each gets its own delivery status
+                connection.send_messages([message])
+            except Exception as e:
+                logger.warning("Error sending email %s (attempt %d): %s", email.id, email.attempts + 1, e)
+                _record_failure(email, e)
+                failed += 1
+            else:
+                email.status = 'SENT'
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.claimed_by = ''
+                email.save(update_fields=['status', 'attempts', 'sent_at', 'claimed_by'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def send_pending(batch_size=BATCH_SIZE):
+    """Sends batches until nothing is due. Returns (sent, failed) totals."""
+    worker_id = uuid.uuid4().hex
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size, worker_id)
+        if not sent and not failed:
+            return total_sent, total_failed
+        total_sent += sent
+        total_failed += failed
+
+
+def _run():
+    while True:
+        _wake.wait(POLL_INTERVAL)
+        _wake.clear()
+        try:
+            close_old_connections()
+            send_pending()
+        except Exception:
+            logger.exception("Email queue error")
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='email-outbox', daemon=True)
+            _thread.start()
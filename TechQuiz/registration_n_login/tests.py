@@ -1,3 +1,359 @@
-from django.test import TestCase
+import re
+import threading
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from instructor.models import GameState
+from .models import OutboundEmail, Team, TeamEmail
+from . import outbox, throttle
+
+CLIENTS = 300
+# Polls per client per minute: waiting room every 3s, leaderboard every 5s
+STATUS_POLLS_PER_MINUTE = 20
+LEADERBOARD_POLLS_PER_MINUTE = 12
+
+
+def is_write(sql):
+    return sql.lstrip().split(' ', 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+# Let the whole simulated crowd log in at once
+UNTHROTTLED = {'ip': {'capacity': CLIENTS, 'per': 1}, 'global': {'capacity': CLIENTS, 'per': 1}}
+
+
+@mock.patch.dict(throttle.OTP_THROTTLE, UNTHROTTLED)
+class SessionWriteBenchmark(TestCase):
+    """DB writes per minute caused by polling, for 300 logged-in clients, per session configuration."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teams = [
+            Team.objects.create(
+                team_name=f'Team {n}',
+                primary_member_name='A', primary_member_email=f'lead{n}@example.com',
+                supporting_member_name='B', supporting_member_email=f'second{n}@example.com',
+            )
+            for n in range(CLIENTS)
+        ]
+        GameState.load()
+
+    def log_in(self, team):
+        client = Client()
+        client.post(reverse('login'), {'email': team.primary_member_email})
+        otp = re.search(r'\d{6}', OutboundEmail.objects.latest('id').body).group()
+        response = client.post(reverse('verify_otp'), {'otp': otp})
+        self.assertRedirects(response, reverse('waiting_room'), fetch_redirect_response=False)
+        return client
+
+    def writes_per_minute(self):
+        cache.clear()
+        clients = [self.log_in(team) for team in self.teams]
+        polls = [(reverse('get_game_status'), STATUS_POLLS_PER_MINUTE), (reverse('get_leaderboard'), LEADERBOARD_POLLS_PER_MINUTE)]
+
+        per_minute = 0
+        for url, polls_per_minute in polls:
+            with CaptureQueriesContext(connection) as ctx:
+                for client in clients:
+                    self.assertEqual(client.get(url).status_code, 200)
+            writes = sum(1 for query in ctx.captured_queries if is_write(query['sql']))
+            per_minute += writes * polls_per_minute
+        return per_minute
+
+    def test_polling_writes(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_SAVE_EVERY_REQUEST=True):
+            before = self.writes_per_minute()
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_SAVE_EVERY_REQUEST=False):
+            db = self.writes_per_minute()
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', SESSION_SAVE_EVERY_REQUEST=False):
+            cached_db = self.writes_per_minute()
+
+        self.assertEqual(before, CLIENTS * (STATUS_POLLS_PER_MINUTE + LEADERBOARD_POLLS_PER_MINUTE))
+        self.assertEqual(db, 0)
+        self.assertEqual(cached_db, 0)
+
+
+@mock.patch.dict(throttle.OTP_THROTTLE, {'cooldown': 0})
+class OtpResendTests(TestCase):
+    """A resent OTP is the one verify_otp accepts, whichever worker process serves the verify."""
+
+    def setUp(self):
+        cache.clear()
+        self.team = Team.objects.create(
+            team_name='Team', primary_member_name='A', primary_member_email='lead@example.com',
+            supporting_member_name='B', supporting_member_email='second@example.com',
+        )
+
+    def latest_otp(self):
+        return re.search(r'\d{6}', OutboundEmail.objects.latest('id').body).group()
+
+    def test_resend_then_verify(self):
+        self.client.post(reverse('login'), {'email': self.team.primary_member_email})
+        # What another worker's per-process cache holds from before the resend, if the engine caches
+        store = import_module(settings.SESSION_ENGINE).SessionStore(self.client.session.session_key)
+        stale = cache.get(store.cache_key) if hasattr(store, 'cache_key') else None
+
+        response = self.client.post(reverse('verify_otp'), {'resend': 'true'})
+        self.assertEqual(response.status_code, 200)
+        second = self.latest_otp()
+        if stale is not None:
+            cache.set(store.cache_key, stale)  # The verify lands on that other worker
+
+        response = self.client.post(reverse('verify_otp'), {'otp': second})
+        self.assertRedirects(response, reverse('waiting_room'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['user_id'], self.team.id)
+
+
+@mock.patch.object(outbox, 'EMAIL_SEND_ON_COMMIT', False)  # Leave the queued mail to the claims under test
+class OutboxClaimTests(TransactionTestCase):
+    """Workers claiming due mail at the same time never get the same message."""
+
+    WORKERS = 8
+
+    def test_concurrent_claims_are_disjoint(self):
+        emails = [outbox.queue_email(f'Subject {n}', 'Body', [f'to{n}@example.com']) for n in range(40)]
+        claims = {}
+        start = threading.Barrier(self.WORKERS)
+
+        def worker(n):
+            start.wait()
+            try:
+                claims[n] = [email.id for email in outbox.claim_due(f'worker{n}', batch_size=10)]
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        claimed = [email_id for ids in claims.values() for email_id in ids]
+        self.assertEqual(len(claimed), len(set(claimed)))
+        self.assertEqual(len(claims), self.WORKERS)
+        # Each row is marked with the one worker that got it
+        for n, ids in claims.items():
+            self.assertEqual(set(OutboundEmail.objects.filter(claimed_by=f'worker{n}').values_list('id', flat=True)), set(ids))
+        self.assertLessEqual(set(claimed), {email.id for email in emails})
+
+    def test_stale_claim_is_taken_over(self):
+        email = outbox.queue_email('Subject', 'Body', ['to@example.com'])
+        self.assertEqual(outbox.claim_due('dead'), [email])
+        self.assertEqual(outbox.claim_due('other'), [])
+
+        OutboundEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now() - outbox.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(outbox.claim_due('other'), [email])
+
+
+class OutboxSendOnCommitTests(TestCase):
+    """Queued mail goes out when the request's transaction commits; failures are left for the worker."""
+
+    def queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            email = outbox.queue_email('Subject', 'Body', ['to@example.com'])
+        email.refresh_from_db()
+        return email
+
+    def test_sent_on_commit(self):
+        email = self.queue()
+        self.assertEqual((email.status, email.attempts), ('SENT', 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failure_is_left_for_a_retry(self):
+        connection = mock.Mock()
+        connection.send_messages.side_effect = OSError('SMTP down')
+        with mock.patch.object(outbox, 'get_connection', return_value=connection), self.assertLogs('registration_n_login.outbox', 'WARNING'):
+            email = self.queue()
+        self.assertEqual((email.status, email.attempts, email.claimed_by), ('PENDING', 1, ''))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_message_claimed_by_a_worker_is_not_sent_twice(self):
+        email = outbox.queue_email('Subject', 'Body', ['to@example.com'])
+        self.assertEqual(outbox.claim_due('worker'), [email])
+        self.assertEqual(outbox.send_now(email.id), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_check_warns_when_nothing_sends(self):
+        from .checks import check_email_sending
+        with override_settings(EMAIL_SEND_ON_COMMIT=False, EMAIL_QUEUE_THREAD=False):
+            self.assertEqual([w.id for w in check_email_sending(None)], ['registration_n_login.W001'])
+        with override_settings(EMAIL_SEND_ON_COMMIT=True, EMAIL_QUEUE_THREAD=False):
+            self.assertEqual(check_email_sending(None), [])
+
+
+class OutboxRetryTests(TestCase):
+    """Failed sends back off exponentially, then give up."""
+
+    def setUp(self):
+        self.email = outbox.queue_email('Subject', 'Body', ['to@example.com'])
+
+    def fail_send(self):
+        connection = mock.Mock()
+        connection.send_messages.side_effect = OSError('SMTP down')
+        with mock.patch.object(outbox, 'get_connection', return_value=connection), self.assertLogs('registration_n_login.outbox', 'WARNING'):
+            self.assertEqual(outbox.send_batch(), (0, 1))
+        self.email.refresh_from_db()
+
+    def make_due(self):
+        OutboundEmail.objects.filter(id=self.email.id).update(next_attempt_at=timezone.now())
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        delays = [outbox.retry_delay(attempts).total_seconds() for attempts in range(1, 5)]
+        self.assertEqual(delays, [outbox.RETRY_BASE * 2 ** n for n in range(4)])
+        self.assertEqual(outbox.retry_delay(50).total_seconds(), outbox.RETRY_MAX)
+
+    def test_failure_is_retried_after_the_backoff(self):
+        self.fail_send()
+        self.assertEqual((self.email.status, self.email.attempts, self.email.claimed_by), ('PENDING', 1, ''))
+        self.assertEqual(self.email.last_error, 'SMTP down')
+        wait = self.email.next_attempt_at - timezone.now()
+        self.assertAlmostEqual(wait.total_seconds(), outbox.RETRY_BASE, delta=5)
+        # Not due yet
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+        self.make_due()
+        self.fail_send()
+        wait = self.email.next_attempt_at - timezone.now()
+        self.assertAlmostEqual(wait.total_seconds(), outbox.RETRY_BASE * 2, delta=5)
+
+        self.make_due()
+        self.assertEqual(outbox.send_batch(), (1, 0))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('SENT', 3))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_last_attempt_marks_failed(self):
+        OutboundEmail.objects.filter(id=self.email.id).update(attempts=outbox.MAX_ATTEMPTS - 1)
+        self.fail_send()
+        self.assertEqual((self.email.status, self.email.attempts), ('FAILED', outbox.MAX_ATTEMPTS))
+
+        # Never picked up again
+        self.make_due()
+        self.assertEqual(outbox.claim_due('worker'), [])
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+
+def make_team(name, primary, supporting):
+    return Team.objects.create(
+        team_name=name, primary_member_name='A', primary_member_email=primary,
+        supporting_member_name='B', supporting_member_email=supporting,
+    )
+
+
+class TeamEmailTests(TestCase):
+    """Member emails are unique across teams whatever their case, and login finds them the same way."""
+
+    def setUp(self):
+        cache.clear()
+        self.team = make_team('Alpha', 'Lead@Example.com', 'second@example.com')
+
+    def test_rows_are_normalized(self):
+        self.assertEqual(
+            set(self.team.emails.values_list('email', 'role')),
+            {('lead@example.com', 'PRIMARY'), ('second@example.com', 'SUPPORTING')},
+        )
+
+    def test_email_differing_only_in_case_is_refused(self):
+        for email in ('LEAD@example.com', ' second@EXAMPLE.com '):
+            with self.subTest(email=email), self.assertRaises(ValidationError):
+                make_team('Beta', email, 'other@example.com')
+        # The failed saves were rolled back with their team
+        self.assertEqual(list(Team.objects.values_list('team_name', flat=True)), ['Alpha'])
+
+    def test_insert_race_is_a_validation_error(self):
+        # Another team registered the email after the check: the unique index catches it
+        with mock.patch.object(Team, 'conflicting_emails', return_value=set()), self.assertRaises(ValidationError):
+            make_team('Beta', 'lead@example.com', 'other@example.com')
+        self.assertEqual(TeamEmail.objects.get(email='lead@example.com').team, self.team)
+
+    def test_editing_own_emails_is_allowed(self):
+        self.team.primary_member_email, self.team.supporting_member_email = 'second@example.com', 'LEAD@example.com'
+        self.team.save()
+        self.assertEqual(TeamEmail.find_team('lead@example.com', role='SUPPORTING'), self.team)
+
+    def test_register_race_shows_form_error(self):
+        data = {
+            'team_name': 'Beta', 'primary_member_name': 'A', 'primary_member_email': 'LEAD@example.com',
+            'supporting_member_name': 'B', 'supporting_member_email': 'other@example.com',
+        }
+        with mock.patch.object(TeamEmail, 'taken', return_value=set()):  # The form's check ran before the other save
+            response = self.client.post(reverse('register'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Already registered by another team')
+        self.assertFalse(Team.objects.filter(team_name='Beta').exists())
+
+    def test_find_team(self):
+        self.assertEqual(TeamEmail.find_team('  LEAD@example.COM '), self.team)
+        self.assertEqual(TeamEmail.find_team('lead@example.com', role='PRIMARY'), self.team)
+        self.assertIsNone(TeamEmail.find_team('second@example.com', role='PRIMARY'))
+        self.assertIsNone(TeamEmail.find_team('nobody@example.com'))
+
+    def test_login_lookup_ignores_case(self):
+        response = self.client.post(reverse('login'), {'email': ' lead@EXAMPLE.com'})
+        self.assertRedirects(response, reverse('verify_otp'), fetch_redirect_response=False)
+
+        response = self.client.post(reverse('login'), {'email': 'second@example.com'})
+        self.assertContains(response, 'Email not registered as Primary Member.')
+
+
+class OtpThrottleTests(TestCase):
+    """Each throttle turns an OTP request away with 429 and a Retry-After, through the views."""
+
+    def setUp(self):
+        cache.clear()
+        self.teams = [make_team(f'Team {n}', f'lead{n}@example.com', f'second{n}@example.com') for n in range(3)]
+
+    def request_otp(self, team, ip='10.0.0.1'):
+        return Client(REMOTE_ADDR=ip).post(reverse('login'), {'email': team.primary_member_email})
+
+    def assertThrottled(self, response, reason, max_wait):
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Too many OTP requests', status_code=429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= max_wait, response['Retry-After'])
+        self.assertEqual(throttle.get_stats()[reason], 1)
+
+    def test_cooldown(self):
+        self.assertEqual(self.request_otp(self.teams[0]).status_code, 302)
+        # Same email from another browser, before the cooldown is over
+        self.assertThrottled(self.request_otp(self.teams[0]), 'cooldown', throttle.OTP_THROTTLE['cooldown'])
+
+    def test_cooldown_on_resend(self):
+        client = Client()
+        client.post(reverse('login'), {'email': self.teams[0].primary_member_email})
+        response = client.post(reverse('verify_otp'), {'resend': 'true'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= throttle.OTP_THROTTLE['cooldown'])
+        self.assertEqual(throttle.get_stats()['cooldown'], 1)
+
+    @mock.patch.dict(throttle.OTP_THROTTLE, {'cooldown': 0, 'email': {'capacity': 2, 'per': 60}})
+    def test_email_bucket(self):
+        for _ in range(2):
+            self.assertEqual(self.request_otp(self.teams[0]).status_code, 302)
+        self.assertThrottled(self.request_otp(self.teams[0]), 'email', 60)
+        # Other emails are unaffected
+        self.assertEqual(self.request_otp(self.teams[1]).status_code, 302)
+
+    @mock.patch.dict(throttle.OTP_THROTTLE, {'ip': {'capacity': 2, 'per': 10}})
+    def test_ip_bucket(self):
+        for team in self.teams[:2]:
+            self.assertEqual(self.request_otp(team).status_code, 302)
+        self.assertThrottled(self.request_otp(self.teams[2]), 'ip', 10)
+        self.assertEqual(self.request_otp(self.teams[2], ip='10.0.0.2').status_code, 302)
+
+    @mock.patch.dict(throttle.OTP_THROTTLE, {'global': {'capacity': 2, 'per': 5}})
+    def test_global_bucket(self):
+        for n, team in enumerate(self.teams[:2]):
+            self.assertEqual(self.request_otp(team, ip=f'10.0.0.{n}').status_code, 302)
+        self.assertThrottled(self.request_otp(self.teams[2], ip='10.0.0.9'), 'global', 5)
+        # A throttled request leaves no cooldown behind, so the team can retry once a token is back
+        self.assertIsNone(cache.get(throttle.COOLDOWN_KEY.format(self.teams[2].primary_member_email)))
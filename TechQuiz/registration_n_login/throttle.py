@@ -0,0 +1,104 @@
+"""
+Throttling for OTP emails (login and resend).
+
+Each OTP request must pass, in order:
+  - a cooldown per email address, so double clicks and impatient resends don't
+    send a second OTP while the first is still on its way;
+  - token buckets per email, per client IP and for the whole site. The global
+    bucket caps the rate at which OTP mail reaches the outbox, which keeps the
+    Gmail account under its sending limits during the login rush.
+
+State lives in the Django cache, so it is shared between worker processes when
+CACHE_LOCATION points at Redis. Bucket updates are serialized per process; two
+processes updating the same bucket at the same instant can overshoot it by a
+token, which is acceptable for throttling. Counters for the instructor
+dashboard are kept alongside (get_stats()).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# capacity: burst size; per: seconds to regain one token
+OTP_THROTTLE = getattr(settings, 'OTP_THROTTLE', {
+    'cooldown': 30,
+    'email': {'capacity': 5, 'per': 60},
+    # Generous: a whole venue may share one NAT address
+    'ip': {'capacity': 60, 'per': 1},
+    'global': {'capacity': 60, 'per': 0.5},
+})
+
+COOLDOWN_KEY = 'otp:cooldown:{}'
+BUCKET_KEY = 'otp:bucket:{}:{}'
+STATS_KEY = 'otp:stats:{}'
+STATS = ('issued', 'cooldown', 'email', 'ip', 'global')
+
+_lock = threading.Lock()
+
+
+def client_ip(request):
+    if getattr(settings, 'OTP_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _refill(key, capacity, per, now):
+    tokens, updated = cache.get(key) or (capacity, now)
+    return min(capacity, tokens + (now - updated) / per)
+
+
+def _count(name):
+    key = STATS_KEY.format(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def allow_otp(email, ip):
+    """
+    Records an OTP request. Returns (allowed, reason, retry_after_seconds);
+    reason is None when allowed, else one of 'cooldown', 'email', 'ip', 'global'.
+    """
+    email = email.strip().lower()
+    now = time.time()
+
+    # add() is atomic: of two simultaneous requests for one email, only one gets through
+    cooldown_key = COOLDOWN_KEY.format(email)
+    if not cache.add(cooldown_key, now + OTP_THROTTLE['cooldown'], OTP_THROTTLE['cooldown']):
+        _count('cooldown')
+        cooldown_until = cache.get(cooldown_key) or now
+        return False, 'cooldown', max(int(cooldown_until - now) + 1, 1)
+
+    buckets = [('email', email), ('ip', ip), ('global', 'all')]
+    with _lock:
+        levels = {}
+        for scope, name in buckets:
+            config = OTP_THROTTLE[scope]
+            tokens = _refill(BUCKET_KEY.format(scope, name), config['capacity'], config['per'], now)
+            if tokens < 1:
+                # Nothing was sent, so don't hold the email in a cooldown
+                cache.delete(cooldown_key)
+                _count(scope)
+                return False, scope, int((1 - tokens) * config['per']) + 1
+            levels[scope, name] = tokens
+
+        # Every bucket has a token: take one from each
+        for (scope, name), tokens in levels.items():
+            config = OTP_THROTTLE[scope]
+            timeout = int(config['capacity'] * config['per']) + 60  # By then the bucket is full again
+            cache.set(BUCKET_KEY.format(scope, name), (tokens - 1, now), timeout)
+
+    _count('issued')
+    return True, None, 0
+
+
+def get_stats():
+    counts = cache.get_many([STATS_KEY.format(name) for name in STATS])
+    stats = {name: counts.get(STATS_KEY.format(name), 0) for name in STATS}
+    stats['throttled'] = sum(stats[name] for name in STATS if name != 'issued')
+    return stats
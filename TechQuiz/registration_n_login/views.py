@@ -1,45 +1,34 @@
+import logging
+
+from django.core.exceptions import ValidationError
 from django.shortcuts import render, redirect, HttpResponse
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import Team
+from .models import TeamEmail
 from .forms import TeamRegistrationForm
+from .emails import registration_email
+from .outbox import queue_email
+from . import throttle
+
+logger = logging.getLogger(__name__)
 
 def register(request):
     if request.method == 'POST':
         form = TeamRegistrationForm(request.POST)
         if form.is_valid():
-            team = form.save()
+            try:
+                team = form.save()
+            except ValidationError as e:
+                # Another registration took one of the emails after the form checked them
+                form.add_error(None, e)
+                return render(request, 'registration_n_login/register.html', {'form': form})
             
             # Send Email
-            subject = 'TechQuiz: Team Registration Successful'
-            message = (
-                f"Dear Team {team.team_name},\n\n"
-                f"Greetings from the Tech Innovation & Creativity Club!\n\n"
-                f"We are pleased to inform you that your registration for the TechQuiz Competition has been successfully confirmed. 🎉\n"
-                f"Thank you for showing enthusiasm and interest in participating—your curiosity and competitive spirit are exactly what "
-                f"TechQuiz is designed to celebrate.\n\n"
-                f"To ensure smooth communication regarding competition updates, schedules, rules, and announcements, "
-                f"all registered teams are required to join the official TechQuiz WhatsApp Channel using the link provided below:\n\n"
-                f"🔗 WhatsApp Channel Link: https://chat.whatsapp.com/J6EoNG9UOEN9G5H0mY4USg\n\n"
-                f"Please make sure that at least one team representative joins the channel at the earliest to avoid missing any important information.\n\n"
-                f"If you have any queries or require assistance, feel free to reach out to us through the WhatsApp channel or contact to 7387 47 7279.\n\n"
-                f"We look forward to your active participation and wish Team {team.team_name} the very best for the competition.\n\n"
-                f"Warm regards,\n"
-                f"Tech Innovation and Creativity Club\n"
-            )
-            recipient_list = [team.primary_member_email, team.supporting_member_email]
-            
+            subject, message, recipient_list = registration_email(team)
+
             try:
-                send_mail(
-                    subject, 
-                    message, 
-                    settings.EMAIL_HOST_USER, 
-                    recipient_list, 
-                    fail_silently=False
-                )
-            except Exception as e:
-                print(f"Error sending email: {e}")
-                # You might want to log this but usually we still show success page
+                queue_email(subject, message, recipient_list)
+            except Exception:
+                # The team is registered either way; still show the success page
+                logger.exception("Error queueing registration email for team %s", team.id)
 
             return redirect('success')
     else:
@@ -56,10 +45,18 @@ def login_view(request):
         email = request.POST.get('email', '').strip()
         
         # Check if email exists as primary member
-        try:
-            team = Team.objects.get(primary_member_email__iexact=email)
-        except Team.DoesNotExist:
+        team = TeamEmail.find_team(email, role='PRIMARY')
+        if team is None:
             return render(request, 'registration_n_login/login.html', {'message': 'Email not registered as Primary Member.', 'email': email})
+
+        allowed, reason, retry_after = throttle.allow_otp(email, throttle.client_ip(request))
+        if not allowed:
+            if reason == 'cooldown' and request.session.get('auth_email') == email and 'auth_otp' in request.session:
+                # Repeat click: the OTP from the first one is already on its way
+                return redirect('verify_otp')
+            response = render(request, 'registration_n_login/login.html', {'message': f'Too many OTP requests. Please try again in {retry_after} seconds.', 'email': email}, status=429)
+            response['Retry-After'] = retry_after
+            return response
             
         # Generate OTP
         otp = str(random.randint(100000, 999999))
@@ -68,13 +65,11 @@ def login_view(request):
         request.session['auth_otp'] = otp
         request.session['auth_email'] = email
         
-        # Send Email
-        send_mail(
+        # Send Email (queued; the outbox worker delivers it)
+        queue_email(
             'TechQuiz Login OTP',
             f'Your OTP for TechQuiz Login is: {otp}',
-            settings.EMAIL_HOST_USER,
             [email],
-            fail_silently=False,
         )
         
         return redirect('verify_otp')
@@ -87,19 +82,22 @@ def verify_otp(request):
         if request.POST.get('resend') == 'true':
             email = request.session.get('auth_email')
             if email:
+                allowed, reason, retry_after = throttle.allow_otp(email, throttle.client_ip(request))
+                if not allowed:
+                    response = HttpResponse(f"Please wait {retry_after} seconds before requesting another OTP", status=429)
+                    response['Retry-After'] = retry_after
+                    return response
                 otp = str(random.randint(100000, 999999))
                 request.session['auth_otp'] = otp
                 try:
-                    send_mail(
+                    queue_email(
                         'TechQuiz Login OTP (Resent)',
                         f'Your new OTP for TechQuiz Login is: {otp}',
-                        settings.EMAIL_HOST_USER,
                         [email],
-                        fail_silently=False,
                     )
                     return HttpResponse("OTP Resent")
-                except Exception as e:
-                    print(f"Resend Error: {e}")
+                except Exception:
+                    logger.exception("Error queueing resent OTP")
                     return HttpResponse("Error sending email", status=500)
             return HttpResponse("Session expired", status=400)
 
@@ -109,9 +107,10 @@ def verify_otp(request):
         if user_otp == session_otp:
             # Login Success
             email = request.session.get('auth_email')
-            team = Team.objects.get(primary_member_email=email)
+            team = TeamEmail.find_team(email, role='PRIMARY')
             
-            # Set session/cookie for logged in state
+            # Set session/cookie for logged in state (new key, so a pre-login session id can't be reused)
+            request.session.cycle_key()
             request.session['user_id'] = team.id
             request.session['is_authenticated'] = True
             
@@ -1,12 +1,12 @@
 from django.shortcuts import render, redirect, HttpResponse
 from django.contrib.auth.decorators import login_required
 from instructor.models import GameState
-from .utils import get_questions_from_sheet
+from instructor.question_bank import get_questions
 import json
 
 def round_1_view(request):
-    # Fetch questions from Google Sheet
-    questions = get_questions_from_sheet()
+    # Fetch questions (served from the question bank cache)
+    questions = get_questions(1)
     
     # Optional: Check if Round 1 is active
     try:
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from instructor.models import GameState
-from .utils import get_round2_questions
+from instructor.question_bank import get_questions
 import json
 
 # @login_required(login_url='/waiting-room/') # REMOVED: Uses Django Auth, but we use Session Auth
@@ -22,8 +22,8 @@ def round_2_view(request):
     except:
         pass
 
-    # Fetch questions
-    questions = get_round2_questions()
+    # Fetch questions (served from the question bank cache)
+    questions = get_questions(2)
     
     # Sanitize for Frontend (Server-Side Scoring Security)
     frontend_questions = []